@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.context_cache import grade_with_context_cache
+from backend.duplicate_index import assignment_key, get_duplicate_index, minhash_signature
+from backend.gemini_api import get_gemini_response, parse_grading_response
+from backend.long_document import grade_long_essay, is_long_essay
+from backend.file_utils import read_file_path
+from backend.grading_journal import GradingJournal, file_hash, journal_key, open_for_append, rubric_hash
+from backend.metrics import span
+from backend.response_cache import get_response_cache
+from backend.result_export import BulkExporter
+from backend.tiering import MODES
+
+SUPPORTED_EXTENSIONS = ('txt', 'docx', 'pdf')
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        # rate is in requests per second; capacity bounds the burst size
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def is_retryable(error):
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return False
+    return code == 429 or 500 <= code < 600
+
+def call_with_retries(func, *args, max_retries=5, base_delay=1.0, max_delay=60.0, rate_limiter=None, request_slots=None):
+    # request_slots is a semaphore bounding the requests in flight across the whole batch; it
+    # is held for each attempt, not while backing off
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            if request_slots is None:
+                return func(*args)
+            with request_slots:
+                return func(*args)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+
+def load_essays(source):
+    # source is a directory of essay files or a manifest listing one path per line
+    # (JSON lines with "id" and "path" keys are accepted as well)
+    if os.path.isdir(source):
+        entries = []
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path) and name.lower().split('.')[-1] in SUPPORTED_EXTENSIONS:
+                entries.append((os.path.splitext(name)[0], path))
+        return entries
+    base_dir = os.path.dirname(os.path.abspath(source))
+    entries = []
+    with open(source, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                path = record['path']
+                essay_id = record.get('id') or os.path.splitext(os.path.basename(path))[0]
+            else:
+                path = line
+                essay_id = os.path.splitext(os.path.basename(path))[0]
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            entries.append((essay_id, path))
+    return entries
+
+def grade_one(essay_id, path, rubric, extra, rate_limiter, max_retries, use_cache=True, mode=None,
+              duplicate_index=None, reuse_duplicates=False, journal=None, request_slots=None):
+    # Returns (result, key): key is the journal key of an essay graded by this run, which
+    # grade_batch marks completed once the result has been handed to on_result
+    if journal is None:
+        return _grade_one(essay_id, path, rubric, extra, rate_limiter, max_retries, use_cache, mode, duplicate_index, reuse_duplicates,
+                          request_slots), None
+    # Journaled: essays completed by an earlier run are returned from the journal, everything
+    # else (new, in flight or failed when that run stopped) is graded
+    try:
+        key = journal_key(file_hash(path), rubric_hash(rubric, extra, mode))
+    except OSError as e:
+        return {"id": essay_id, "path": path, "status": "error", "error": str(e)}, None
+    completed = journal.result_for(key)
+    if completed is not None:
+        return dict(completed, id=essay_id, path=path, resumed=True), None
+    journal.submitted(key, essay_id)
+    result = _grade_one(essay_id, path, rubric, extra, rate_limiter, max_retries, use_cache, mode, duplicate_index, reuse_duplicates,
+                        request_slots)
+    if result["status"] != "ok":
+        journal.fail(key, essay_id, result.get("error"))
+        return result, None
+    return result, key
+
+def _grade_one(essay_id, path, rubric, extra, rate_limiter, max_retries, use_cache, mode, duplicate_index, reuse_duplicates,
+               request_slots=None):
+    started = time.monotonic()
+    try:
+        essay = read_file_path(path)
+    except OSError as e:
+        # A missing or unreadable file fails this essay, not the whole batch
+        return {"id": essay_id, "path": path, "status": "error", "error": str(e)}
+    if not essay:
+        return {"id": essay_id, "path": path, "status": "error", "error": "Could not read essay file"}
+    duplicate = None
+    if duplicate_index is not None:
+        namespace = assignment_key(rubric, extra, mode)
+        # Indexed by path: file names such as essay1.docx repeat across classes graded with
+        # the same rubric
+        index_id = os.path.abspath(path)
+        with span("duplicate_lookup") as record:
+            signature = minhash_signature(essay)
+            matches = duplicate_index.find(namespace, essay, exclude=index_id, signature=signature)
+            record["matches"] = len(matches)
+        duplicate = matches[0] if matches else None
+        if reuse_duplicates and duplicate and duplicate.result and duplicate.exact:
+            duplicate_index.add(namespace, index_id, essay, duplicate.result, signature)
+            return {
+                "id": essay_id,
+                "path": path,
+                "status": "ok",
+                "grade": duplicate.result["grade"],
+                "feedback": duplicate.result["feedback"],
+                "seconds": round(time.monotonic() - started, 3),
+                "duplicate_of": duplicate.essay_id,
+                "similarity": round(duplicate.similarity, 3),
+                "reused": True,
+            }
+        # Indexed before grading so later essays in the same batch are flagged against it
+        duplicate_index.add(namespace, index_id, essay, signature=signature)
+    try:
+        if is_long_essay(essay):
+            # Each section request is rate limited and retried on its own, and takes one of the
+            # batch's request slots so long essays do not multiply the requests in flight
+            def generate(prompt, use_cache, model, thinking_budget):
+                return call_with_retries(
+                    get_gemini_response, prompt, use_cache, model, thinking_budget,
+                    max_retries=max_retries, rate_limiter=rate_limiter, request_slots=request_slots,
+                )
+            result = grade_long_essay(essay, rubric, extra, use_cache, generate=generate, mode=mode)
+        else:
+            result = call_with_retries(
+                grade_with_context_cache, essay, rubric, extra, use_cache, mode,
+                max_retries=max_retries, rate_limiter=rate_limiter, request_slots=request_slots,
+            )
+    except Exception as e:
+        return {"id": essay_id, "path": path, "status": "error", "error": str(e)}
+    try:
+        parsed = parse_grading_response(result)
+    except ValueError:
+        return {"id": essay_id, "path": path, "status": "error", "error": "Error parsing AI response", "raw": result}
+    result = {
+        "id": essay_id,
+        "path": path,
+        "status": "ok",
+        "grade": parsed["grade"],
+        "feedback": parsed["feedback"],
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    if duplicate_index is not None:
+        duplicate_index.set_result(namespace, index_id, {"grade": result["grade"], "feedback": result["feedback"]})
+    if duplicate is not None:
+        result["duplicate_of"] = duplicate.essay_id
+        result["similarity"] = round(duplicate.similarity, 3)
+    return result
+
+def grade_batch(essays, rubric, extra="", concurrency=8, requests_per_second=None, max_retries=5, use_cache=True, on_result=None, mode=None,
+                duplicate_index=None, reuse_duplicates=False, journal=None):
+    rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+    # Every Gemini call, including the section calls of long essays, holds one of these slots,
+    # so no more than `concurrency` requests are ever in flight
+    request_slots = threading.BoundedSemaphore(concurrency)
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(
+                grade_one, essay_id, path, rubric, extra, rate_limiter, max_retries, use_cache, mode,
+                duplicate_index, reuse_duplicates, journal, request_slots,
+            ): (essay_id, path)
+            for essay_id, path in essays
+        }
+        try:
+            for future in as_completed(futures):
+                try:
+                    result, key = future.result()
+                except Exception as e:
+                    # An unexpected error fails this essay, not the whole batch; it stays
+                    # 'submitted' in the journal and is graded again on resume
+                    essay_id, path = futures[future]
+                    result, key = {"id": essay_id, "path": path, "status": "error", "error": str(e)}, None
+                if on_result is not None:
+                    on_result(result)
+                else:
+                    results.append(result)
+                # Only after on_result has written it, so the journal never records a grade
+                # that is missing from the output
+                if key is not None:
+                    journal.complete(key, result["id"], result)
+        except KeyboardInterrupt:
+            # Drop the queued essays instead of grading them all before exiting; the ones in
+            # flight finish, stay 'submitted' in the journal and are graded again on resume
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return results
+
+def written_ids(path):
+    # Ids of the successful results already in an output file, so resumed results are
+    # written once
+    ids = set()
+    if not os.path.exists(path):
+        return ids
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-write
+                continue
+            if result.get("status") == "ok":
+                ids.add(result.get("id"))
+    return ids
+
+class JsonlResultWriter:
+    def __init__(self, path):
+        self.file = open_for_append(path)
+        self.lock = threading.Lock()
+
+    def __call__(self, result):
+        with self.lock:
+            self.file.write(json.dumps(result) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a batch of essays against one rubric.")
+    parser.add_argument("essays", help="Directory of essay files or a manifest file")
+    parser.add_argument("rubric", help="Rubric file (txt, docx or pdf)")
+    parser.add_argument("--extra", default="", help="Extra grading instructions")
+    parser.add_argument("--output", default="grading_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of requests kept in flight")
+    parser.add_argument("--rps", type=float, default=None, help="Maximum requests per second")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk response cache")
+    parser.add_argument("--mode", choices=MODES, default=None, help="Grading mode; picks the model and thinking budget (default: GRADING_MODE or thorough)")
+    parser.add_argument("--no-duplicate-check", action="store_true", help="Do not flag near-duplicate essays")
+    parser.add_argument("--reuse-duplicates", action="store_true",
+                        help="Reuse the grade of an essay identical (after normalizing case, punctuation and whitespace) to one already graded for this rubric")
+    parser.add_argument("--journal", default=None,
+                        help="Grading journal used to resume an interrupted run (default: the output path with a .journal.jsonl suffix)")
+    parser.add_argument("--no-journal", action="store_true", help="Do not journal progress or resume an earlier run")
+    parser.add_argument("--export-csv", default=None, help="Also stream results to a CSV with one column per feedback section")
+    parser.add_argument("--export-jsonl", default=None, help="Also stream results to a JSONL with the feedback split into sections")
+    parser.add_argument("--export-zip", default=None, help="Also stream one markdown feedback file per essay into a zip archive")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    rubric = read_file_path(args.rubric)
+    if not rubric:
+        parser.error(f"Could not read rubric file: {args.rubric}")
+    essays = load_essays(args.essays)
+    written = written_ids(args.output) if not args.no_journal else set()
+    writer = JsonlResultWriter(args.output)
+    exporter = BulkExporter(args.export_csv, args.export_jsonl, args.export_zip)
+    counts = {"ok": 0, "error": 0, "resumed": 0}
+    duplicate_index = None if args.no_duplicate_check else get_duplicate_index()
+    journal = None
+    if not args.no_journal:
+        journal = GradingJournal(args.journal or os.path.splitext(args.output)[0] + ".journal.jsonl")
+        stats = journal.stats()
+        if stats["completed"] or journal.recovered:
+            print(f"Resuming from {journal.path}: {stats['completed']} essays already graded, {len(journal.recovered)} to retry")
+
+    def on_result(result):
+        # Exports are rewritten on every run, so they include essays resumed from the journal
+        exporter(result)
+        if result.get("resumed"):
+            # Written again only when the run that graded it stopped before writing it
+            counts["resumed"] += 1
+            if result["id"] not in written:
+                written.add(result["id"])
+                writer({key: value for key, value in result.items() if key != "resumed"})
+            return
+        writer(result)
+        counts[result["status"]] += 1
+        duplicate = ""
+        if "duplicate_of" in result:
+            action = "reused grade of" if result.get("reused") else "near-duplicate of"
+            duplicate = f" ({action} {result['duplicate_of']}, {result['similarity']:.0%} similar)"
+        print(f"[{counts['ok'] + counts['error'] + counts['resumed']}/{len(essays)}] {result['id']}: {result.get('grade', result.get('error'))}{duplicate}")
+
+    try:
+        grade_batch(
+            essays, rubric, args.extra, args.concurrency, args.rps, args.max_retries, not args.no_cache,
+            on_result=on_result, mode=args.mode, duplicate_index=duplicate_index, reuse_duplicates=args.reuse_duplicates,
+            journal=journal,
+        )
+    finally:
+        writer.close()
+        exporter.close()
+        if journal is not None:
+            journal.close()
+    resumed = f", {counts['resumed']} resumed from the journal" if counts["resumed"] else ""
+    print(f"Done: {counts['ok']} graded, {counts['error']} failed{resumed}. Results in {args.output}")
+    cache_stats = get_response_cache().stats()
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    if lookups:
+        print(f"Response cache: {cache_stats['hits']} of {lookups} requests served from the cache ({cache_stats['hits'] / lookups:.0%})")
+    return 0 if counts["error"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,4 @@
-import pyperclip
-
 def copy_to_clipboard(grade, feedback):
+    import pyperclip
     clipboard_text = f"Overall Grade: {grade}\n\nDetailed Feedback:\n{feedback}"
     pyperclip.copy(clipboard_text) 
\ No newline at end of file
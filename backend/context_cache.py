@@ -0,0 +1,185 @@
+import atexit
+import os
+import threading
+import time
+
+from backend.file_utils import content_hash
+from backend.gemini_api import (
+    MODEL_NAME, DEFAULT_THINKING_BUDGET, build_contents, build_essay_section, build_rubric_prefix, finish_reason,
+    get_gemini_response, get_generate_content_config, lookup_cached_response, store_response,
+)
+from backend.gemini_client import get_client
+from backend.metrics import span, usage_fields
+from backend.tiering import select_tier
+
+# Gemini rejects explicit caches below a minimum prompt size; smaller prefixes are sent
+# inline, where the prefix-first layout still benefits from implicit caching
+MIN_CACHE_TOKENS = 1024
+# Kept short so caches left behind by a crashed process do not linger; close() deletes the rest
+DEFAULT_TTL_SECONDS = 900
+REFRESH_MARGIN_SECONDS = 60
+CREATE_BACKOFF_SECONDS = 5.0
+MAX_CREATE_BACKOFF_SECONDS = 300.0
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+class LocalPrefixCache:
+    # Local equivalent of a context cache: the prefix is kept in memory and prepended to
+    # each suffix before calling generate. Counters make prefix reuse observable in tests.
+    def __init__(self, generate=None):
+        self.generate_fn = generate or get_gemini_response
+        self.prefixes = {}
+        self.created = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def generate(self, prefix, suffix, use_cache=True, model=MODEL_NAME, thinking_budget=DEFAULT_THINKING_BUDGET):
+        key = content_hash(prefix)
+        with self.lock:
+            if key in self.prefixes:
+                self.reused += 1
+            else:
+                self.prefixes[key] = prefix
+                self.created += 1
+        return self.generate_fn(self.prefixes[key] + suffix, use_cache, model=model, thinking_budget=thinking_budget)
+
+def is_permanent_error(error):
+    # 4xx other than 408/429 (a prefix below the minimum size, a model without caching) will
+    # fail the same way every time; rate limits, 5xx and network errors are worth retrying
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return False
+    return 400 <= code < 500 and code not in (408, 429)
+
+class GeminiContextCache:
+    # Uses Gemini explicit context caching: the prefix is uploaded once per TTL and each
+    # request only sends its own suffix with cached_content pointing at it
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, min_tokens=MIN_CACHE_TOKENS):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.caches = {}
+        self.uncacheable = set()
+        # key -> (failures, retry_at) after a transient create error; requests go inline meanwhile
+        self.backoff = {}
+        self.key_locks = {}
+        self.created = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def _cached_entry(self, key):
+        # Called with self.lock held
+        entry = self.caches.get(key)
+        if entry is not None and entry[1] - REFRESH_MARGIN_SECONDS > time.time():
+            self.reused += 1
+            return entry[0]
+        return None
+
+    def _cache_name(self, prefix, model):
+        # Context caches belong to one model, so each tier's model gets its own
+        key = (model, content_hash(prefix))
+        with self.lock:
+            if key in self.uncacheable:
+                return None
+            name = self._cached_entry(key)
+            if name is not None:
+                return name
+            if estimate_tokens(prefix) < self.min_tokens:
+                self.uncacheable.add(key)
+                return None
+            failures, retry_at = self.backoff.get(key, (0, 0.0))
+            if retry_at > time.time():
+                return None
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # One create per key: concurrent batch workers for the same rubric wait for it and
+        # share the cache, while other rubrics and models are not blocked
+        with key_lock:
+            with self.lock:
+                name = self._cached_entry(key)
+                if name is not None:
+                    return name
+            from google.genai import types
+            try:
+                cached = get_client().caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        contents=build_contents(prefix),
+                        display_name=f"rubric-{key[1][:16]}",
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+            except Exception as e:
+                with self.lock:
+                    if is_permanent_error(e):
+                        self.uncacheable.add(key)
+                    else:
+                        delay = min(MAX_CREATE_BACKOFF_SECONDS, CREATE_BACKOFF_SECONDS * 2 ** failures)
+                        self.backoff[key] = (failures + 1, time.time() + delay)
+                return None
+            with self.lock:
+                self.backoff.pop(key, None)
+                self.caches[key] = (cached.name, time.time() + self.ttl_seconds)
+                self.created += 1
+            return cached.name
+
+    def close(self):
+        # Deletes the caches this process created instead of leaving them to expire
+        with self.lock:
+            names = [name for name, _ in self.caches.values()]
+            self.caches.clear()
+        if not names:
+            return
+        client = get_client()
+        for name in names:
+            try:
+                client.caches.delete(name=name)
+            except Exception:
+                pass
+
+    def generate(self, prefix, suffix, use_cache=True, model=MODEL_NAME, thinking_budget=DEFAULT_THINKING_BUDGET):
+        name = self._cache_name(prefix, model)
+        if name is None:
+            return get_gemini_response(prefix + suffix, use_cache, model=model, thinking_budget=thinking_budget)
+        generate_content_config, config_json = get_generate_content_config(thinking_budget)
+        # Keyed on the full prompt, so it shares entries with inline requests for the same essay
+        cached, cache_key = lookup_cached_response(prefix + suffix, model, config_json, use_cache)
+        if cached is not None:
+            return cached
+        with span("gemini_request", model=model, thinking_budget=thinking_budget, mode="context_cache") as record:
+            response = get_client().models.generate_content(
+                model=model,
+                contents=build_contents(suffix),
+                config=generate_content_config.model_copy(update={"cached_content": name}),
+            )
+            record.update(usage_fields(response.usage_metadata))
+        store_response(cache_key, response.text, finish_reason(response))
+        return response.text
+
+_context_cache = None
+_context_cache_lock = threading.Lock()
+
+def get_context_cache():
+    # GEMINI_CONTEXT_CACHE selects 'gemini' (explicit context caching, the default) or 'local'
+    global _context_cache
+    with _context_cache_lock:
+        if _context_cache is None:
+            if os.getenv('GEMINI_CONTEXT_CACHE', 'gemini') == 'local':
+                _context_cache = LocalPrefixCache()
+            else:
+                _context_cache = GeminiContextCache()
+                atexit.register(_context_cache.close)
+        return _context_cache
+
+def set_context_cache(context_cache):
+    global _context_cache
+    with _context_cache_lock:
+        _context_cache = context_cache
+
+def grade_with_context_cache(essay, rubric, extra_instructions, use_cache=True, mode=None):
+    tier = select_tier(essay, rubric, mode)
+    prefix = build_rubric_prefix(rubric, extra_instructions)
+    return get_context_cache().generate(
+        prefix, build_essay_section(essay), use_cache, model=tier.model, thinking_budget=tier.thinking_budget,
+    )
@@ -0,0 +1,248 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import namedtuple
+
+from backend.tiering import resolve_mode
+
+DEFAULT_INDEX_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.cache', 'duplicate_index.sqlite3'))
+SHINGLE_WORDS = 5
+NUM_BINS = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_BINS // BANDS
+# With 16 bands of 8 bins, pairs above ~0.7 similarity almost always share a bucket
+FLAG_THRESHOLD = 0.8
+# Essay text is kept for the app's diff view and deleted after this many days
+# (DUPLICATE_INDEX_RETENTION_DAYS; 0 keeps everything)
+DEFAULT_RETENTION_DAYS = 180
+PRUNE_INTERVAL_SECONDS = 3600
+
+BIN_BITS = 7
+VALUE_BITS = 64 - BIN_BITS
+VALUE_MASK = (1 << VALUE_BITS) - 1
+EMPTY = VALUE_MASK + 1
+
+HYPHENATED_BREAK = re.compile(r'(\w)-\s*\n\s*(\w)')
+NON_WORD = re.compile(r'[^\w]+')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# exact is True when the normalized text is identical; only exact matches may reuse a grade,
+# since a 128-bin estimate cannot tell a copy from an essay with a few words substituted
+DuplicateMatch = namedtuple('DuplicateMatch', ['essay_id', 'similarity', 'result', 'exact'])
+
+def normalized_words(text):
+    # Undo the differences PDF/DOCX extraction introduces: ligatures and full-width forms,
+    # words hyphenated across lines, case, punctuation and whitespace
+    text = unicodedata.normalize('NFKC', text)
+    text = HYPHENATED_BREAK.sub(r'\1\2', text)
+    return NON_WORD.sub(' ', text.lower()).replace('_', ' ').split()
+
+def normalized_hash(text):
+    return hashlib.sha256(' '.join(normalized_words(text)).encode('utf-8')).hexdigest()
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def minhash_signature(text, shingle_words=SHINGLE_WORDS):
+    # One-permutation MinHash: each shingle is hashed once, the top bits pick one of NUM_BINS
+    # bins and the bin keeps its minimum. Empty bins borrow from the next filled bin so short
+    # essays still produce comparable signatures.
+    words = normalized_words(text)
+    if not words:
+        return None
+    if len(words) < shingle_words:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+    bins = [EMPTY] * NUM_BINS
+    for shingle in shingles:
+        h = _hash64(shingle)
+        index = h >> VALUE_BITS
+        value = h & VALUE_MASK
+        if value < bins[index]:
+            bins[index] = value
+    for index in range(NUM_BINS):
+        if bins[index] == EMPTY:
+            for distance in range(1, NUM_BINS):
+                borrowed = bins[(index + distance) % NUM_BINS]
+                if borrowed != EMPTY:
+                    bins[index] = (borrowed + distance * 0x9E3779B97F4A7C15) & VALUE_MASK
+                    break
+    return tuple(bins)
+
+def estimate_similarity(a, b):
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_BINS
+
+def _band_keys(signature):
+    return [hash((band,) + signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]) for band in range(BANDS)]
+
+def assignment_key(rubric, extra_instructions='', mode=None):
+    # Essays are only compared with others graded against the same rubric, instructions and
+    # grading mode, so a Fast grade is never reused in a Thorough run
+    return normalized_hash(rubric + '\n' + extra_instructions) + ':' + resolve_mode(mode)
+
+def essay_diff(previous, current, context=1):
+    # Sentence-level diff, which stays readable when extraction changed the line breaks
+    def sentences(text):
+        return [s.strip() for s in SENTENCE_END.split(' '.join(text.split())) if s.strip()]
+    return '\n'.join(difflib.unified_diff(
+        sentences(previous), sentences(current), 'previous', 'current', n=context, lineterm='',
+    ))
+
+class _Namespace:
+    def __init__(self):
+        self.signatures = {}
+        self.exact = {}
+        self.buckets = {}
+
+    def add(self, essay_id, text_hash, signature):
+        self.remove(essay_id)
+        self.signatures[essay_id] = (text_hash, signature)
+        self.exact.setdefault(text_hash, set()).add(essay_id)
+        for key in _band_keys(signature):
+            self.buckets.setdefault(key, set()).add(essay_id)
+
+    def remove(self, essay_id):
+        entry = self.signatures.pop(essay_id, None)
+        if entry is None:
+            return
+        text_hash, signature = entry
+        self.exact[text_hash].discard(essay_id)
+        for key in _band_keys(signature):
+            self.buckets[key].discard(essay_id)
+
+class DuplicateIndex:
+    # Signatures are persisted in SQLite and the LSH buckets for an assignment are rebuilt in
+    # memory the first time it is queried, so scoring never touches the database; only the
+    # best match's stored result is read from it. essay_id must identify the submission, not
+    # just its file name (the batch grader uses the file's path), since entries with the same
+    # id replace each other.
+    def __init__(self, path=DEFAULT_INDEX_PATH, retention_days=DEFAULT_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+        self.namespaces = {}
+        self.last_prune = 0.0
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS essays ("
+            "namespace TEXT NOT NULL, essay_id TEXT NOT NULL, text_hash TEXT NOT NULL, signature BLOB NOT NULL, "
+            "text TEXT NOT NULL, result TEXT, indexed_at REAL NOT NULL, PRIMARY KEY (namespace, essay_id))"
+        )
+        self.conn.commit()
+        with self.lock:
+            self._prune()
+
+    def _prune(self):
+        # Called with self.lock held. Loaded namespaces are dropped and rebuilt on next use.
+        self.last_prune = time.time()
+        if not self.retention_days:
+            return
+        deleted = self.conn.execute(
+            "DELETE FROM essays WHERE indexed_at < ?", (time.time() - self.retention_days * 86400,),
+        ).rowcount
+        self.conn.commit()
+        if deleted:
+            self.namespaces.clear()
+
+    def _namespace(self, namespace):
+        entries = self.namespaces.get(namespace)
+        if entries is None:
+            entries = self.namespaces[namespace] = _Namespace()
+            rows = self.conn.execute(
+                "SELECT essay_id, text_hash, signature FROM essays WHERE namespace = ?", (namespace,),
+            )
+            for essay_id, text_hash, blob in rows:
+                entries.add(essay_id, text_hash, tuple(array('Q', blob)))
+        return entries
+
+    def find(self, namespace, text, threshold=FLAG_THRESHOLD, exclude=None, signature=None):
+        # Best match first. Identical normalized text scores 1.0 regardless of the signature.
+        # Only the best match carries its stored result; the others have result=None.
+        signature = signature or minhash_signature(text)
+        if signature is None:
+            return []
+        text_hash = normalized_hash(text)
+        with self.lock:
+            entries = self._namespace(namespace)
+            exact = set(entries.exact.get(text_hash, ()))
+            scores = {essay_id: 1.0 for essay_id in exact}
+            for key in _band_keys(signature):
+                for essay_id in entries.buckets.get(key, ()):
+                    if essay_id not in scores:
+                        scores[essay_id] = estimate_similarity(signature, entries.signatures[essay_id][1])
+            scores.pop(exclude, None)
+            matches = sorted(
+                ((essay_id, score) for essay_id, score in scores.items() if score >= threshold),
+                key=lambda match: -match[1],
+            )
+            return [
+                DuplicateMatch(essay_id, score, self._result(namespace, essay_id) if rank == 0 else None, essay_id in exact)
+                for rank, (essay_id, score) in enumerate(matches)
+            ]
+
+    def _result(self, namespace, essay_id):
+        row = self.conn.execute(
+            "SELECT result FROM essays WHERE namespace = ? AND essay_id = ?", (namespace, essay_id),
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def add(self, namespace, essay_id, text, result=None, signature=None):
+        signature = signature or minhash_signature(text)
+        if signature is None:
+            return
+        text_hash = normalized_hash(text)
+        with self.lock:
+            if time.time() - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+                self._prune()
+            self._namespace(namespace).add(essay_id, text_hash, signature)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO essays (namespace, essay_id, text_hash, signature, text, result, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, essay_id, text_hash, array('Q', signature).tobytes(), text,
+                 json.dumps(result) if result is not None else None, time.time()),
+            )
+            self.conn.commit()
+
+    def set_result(self, namespace, essay_id, result):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE essays SET result = ? WHERE namespace = ? AND essay_id = ?",
+                (json.dumps(result), namespace, essay_id),
+            )
+            self.conn.commit()
+
+    def get_text(self, namespace, essay_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text FROM essays WHERE namespace = ? AND essay_id = ?", (namespace, essay_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        with self.lock:
+            essays, namespaces = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT namespace) FROM essays").fetchone()
+        return {"essays": essays, "assignments": namespaces}
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_duplicate_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DuplicateIndex(
+                os.getenv('DUPLICATE_INDEX_PATH', DEFAULT_INDEX_PATH),
+                float(os.getenv('DUPLICATE_INDEX_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)),
+            )
+        return _index
@@ -0,0 +1,155 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = {
+    "overall_grade": "B+",
+    "detailed_specific_feedback": "**INTRODUCTION ANALYSIS**\nClear thesis.\n\n**BODY PARAGRAPHS ANALYSIS**\nGood evidence.\n\n**CONCLUSION ANALYSIS**\nRestates the thesis.\n\n**OVERALL STRENGTHS**\nOrganization.\n\n**AREAS FOR IMPROVEMENT**\nTransitions.\n\n**SPECIFIC RECOMMENDATIONS**\nVary sentence openings.",
+}
+
+# Local stand-in for the generateContent REST endpoint. Point the client at it with
+# GEMINI_BASE_URL=http://127.0.0.1:<port>/ and any GEMINI_API_KEY.
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        self.server.record_request(self.path, body)
+        self.handle_body(body)
+
+    def do_DELETE(self):
+        name = self.path.split('?')[0].split('/v1beta/')[-1].lstrip('/')
+        self.server.record_request(self.path, None)
+        if self.server.delete_cached_content(name):
+            self.send_json(200, {})
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def handle_body(self, body):
+        if self.path.split('?')[0].endswith('/cachedContents'):
+            self.send_json(200, self.server.create_cached_content(body))
+        elif ':streamGenerateContent' in self.path:
+            self.send_stream(self.server.build_stream(body))
+        elif ':generateContent' in self.path:
+            self.send_json(200, self.server.build_response(body))
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, events):
+        # Server-sent events, one partial GenerateContentResponse per event
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for event in events:
+            self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), response=None, handler=FakeGeminiHandler, stream_chunk_chars=64):
+        super().__init__(address, handler)
+        self.response = response or DEFAULT_RESPONSE
+        self.stream_chunk_chars = stream_chunk_chars
+        self.requests = []
+        self.cached_contents = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def record_request(self, path, body):
+        with self.lock:
+            self.requests.append({"path": path, "body": body})
+
+    def create_cached_content(self, body):
+        with self.lock:
+            name = f"cachedContents/fake-{len(self.cached_contents) + 1}"
+            self.cached_contents[name] = body
+        return {"name": name, "model": body.get("model"), "displayName": body.get("displayName", "")}
+
+    def delete_cached_content(self, name):
+        with self.lock:
+            return self.cached_contents.pop(name, None) is not None
+
+    def response_text(self, body):
+        return json.dumps(self.response)
+
+    def build_response(self, body):
+        text = self.response_text(body)
+        prompt_tokens = sum(
+            len(part.get('text', '').split())
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        output_tokens = len(text.split())
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": "fake-gemini",
+        }
+
+    def build_stream(self, body):
+        full = self.build_response(body)
+        text = full["candidates"][0]["content"]["parts"][0]["text"]
+        pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)]
+        for index, piece in enumerate(pieces):
+            event = {
+                "candidates": [{
+                    "content": {"role": "model", "parts": [{"text": piece}]},
+                    "index": 0,
+                }],
+                "modelVersion": full["modelVersion"],
+            }
+            if index == len(pieces) - 1:
+                event["candidates"][0]["finishReason"] = full["candidates"][0]["finishReason"]
+                event["usageMetadata"] = full["usageMetadata"]
+            yield event
+
+def start_fake_server(host='127.0.0.1', port=0, response=None):
+    server = FakeGeminiServer((host, port), response=response)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini generateContent endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    server = FakeGeminiServer((args.host, args.port))
+    print(f"Fake Gemini server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
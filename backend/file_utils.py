@@ -1,33 +1,130 @@
-import PyPDF2
+import codecs
+import hashlib
 import io
-from docx import Document
+import threading
+from collections import OrderedDict
 import json
 import os
+from backend.metrics import span
+
+TEXT_CHUNK_BYTES = 1024 * 1024
+EXTRACTED_TEXT_CACHE_CHARS = 50 * 1000 * 1000
+PARALLEL_PDF_MIN_BYTES = 2 * 1024 * 1024
+
+class ExtractedTextCache:
+    # LRU of extracted text keyed by (content hash, extension), bounded by total characters
+    def __init__(self, max_chars=EXTRACTED_TEXT_CACHE_CHARS):
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            text = self.entries.get(key)
+            if text is not None:
+                self.entries.move_to_end(key)
+            return text
+
+    def set(self, key, text):
+        if len(text) > self.max_chars:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_chars -= len(self.entries.pop(key))
+            self.entries[key] = text
+            self.total_chars += len(text)
+            while self.total_chars > self.max_chars:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_chars -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_chars = 0
+
+extracted_text_cache = ExtractedTextCache()
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+def file_extension_of(name):
+    return name.lower().split('.')[-1]
+
+def upload_hash(uploaded_file):
+    # getbuffer() exposes the uploaded bytes without copying them
+    if hasattr(uploaded_file, 'getbuffer'):
+        with uploaded_file.getbuffer() as buffer:
+            return content_hash(buffer)
+    return content_hash(uploaded_file.getvalue())
+
+def upload_size(uploaded_file):
+    if hasattr(uploaded_file, 'getbuffer'):
+        with uploaded_file.getbuffer() as buffer:
+            return buffer.nbytes
+    return len(uploaded_file.getvalue())
 
 def read_uploaded_file(uploaded_file):
     if uploaded_file is None:
         return ""
-    file_extension = uploaded_file.name.lower().split('.')[-1]
-    try:
-        if file_extension == 'pdf':
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.getvalue()))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        elif file_extension == 'docx':
-            doc = Document(io.BytesIO(uploaded_file.getvalue()))
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
-        elif file_extension == 'txt':
-            return uploaded_file.getvalue().decode("utf-8")
+    file_extension = file_extension_of(uploaded_file.name)
+    key = (upload_hash(uploaded_file), file_extension)
+    text = extracted_text_cache.get(key)
+    if text is not None:
+        return text
+    uploaded_file.seek(0)
+    with span("extract", file_type=file_extension) as record:
+        if file_extension == 'pdf' and upload_size(uploaded_file) >= PARALLEL_PDF_MIN_BYTES:
+            from backend.parallel_extract import extract_pdf_parallel
+            text = extract_pdf_parallel(uploaded_file)
+            record["parallel"] = True
         else:
-            return None
+            text = extract_text(uploaded_file, file_extension)
+        record["chars"] = len(text) if text else 0
+    if text is not None:
+        extracted_text_cache.set(key, text)
+    return text
+
+def read_file_path(path):
+    file_extension = file_extension_of(path)
+    with span("extract", file_type=file_extension) as record, open(path, 'rb') as f:
+        text = extract_text(f, file_extension)
+        record["chars"] = len(text) if text else 0
+        return text
+
+def extract_text(source, file_extension):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        return "".join(iter_document_text(source, file_extension))
     except Exception as e:
         return None
 
+def iter_document_text(stream, file_extension):
+    # Yields text one PDF page, DOCX paragraph or TXT chunk at a time
+    if file_extension == 'pdf':
+        import PyPDF2
+        pdf_reader = PyPDF2.PdfReader(stream)
+        for page in pdf_reader.pages:
+            yield page.extract_text() + "\n"
+    elif file_extension == 'docx':
+        from docx import Document
+        doc = Document(stream)
+        for paragraph in doc.paragraphs:
+            yield paragraph.text + "\n"
+    elif file_extension == 'txt':
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            chunk = stream.read(TEXT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
 def load_user_settings(settings_path='user_settings.json'):
     if not os.path.exists(settings_path):
         return {}
@@ -37,13 +134,3 @@ def load_user_settings(settings_path='user_settings.json'):
 def save_user_settings(settings, settings_path='user_settings.json'):
     with open(settings_path, 'w') as f:
         json.dump(settings, f, indent=2)
-
-def save_grammar_spelling_issues(issues, path='grammar_spelling_issues.json'):
-    with open(path, 'w') as f:
-        json.dump(issues, f, indent=2)
-
-def load_grammar_spelling_issues(path='grammar_spelling_issues.json'):
-    if not os.path.exists(path):
-        return []
-    with open(path, 'r') as f:
-        return json.load(f) 
\ No newline at end of file
@@ -1,19 +1,24 @@
-import os
-from google import genai
-from google.genai import types
+import json
+import time
+from functools import lru_cache
+from backend.gemini_client import get_client
+from backend.metrics import span, usage_fields
+from backend.response_cache import get_response_cache, make_cache_key
 
-def build_gemini_prompt(essay, rubric, extra_instructions):
-    prompt = f"""
+MODEL_NAME = "gemini-2.5-flash"
+DEFAULT_THINKING_BUDGET = -1
+
+def build_rubric_prefix(rubric, extra_instructions):
+    # Everything that is shared by all essays graded against the same rubric. It comes
+    # first in the prompt so it can be reused as a cached context prefix.
+    prefix = f"""
 You are a highly skilled and fair essay evaluator for high school and college-level writing. Your job is to:
 
-1. Analyze the given student essay thoroughly.
+1. Analyze the student essay given at the end of this prompt thoroughly.
 2. Score it using the provided rubric and grading system.
 3. Provide detailed, specific feedback that quotes exact sentences/phrases from the essay and gives targeted advice.
 4. Follow any extra grading instructions provided.
 
-Essay:
-{essay}
-
 Rubric:
 {rubric}
 
@@ -46,24 +51,44 @@ Be thorough, specific, and constructive in your feedback. Always quote the exact
 
 CRITICAL: Keep your response concise and to the point. Avoid unnecessary verbosity and lengthy explanations. Focus on the most important feedback points and be direct in your analysis.
 """
-    return prompt
-
-def get_gemini_response(prompt):
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables")
-    client = genai.Client(api_key=api_key)
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=prompt),
-            ],
-        ),
-    ]
-    generate_content_config = types.GenerateContentConfig(
+    return prefix
+
+def build_essay_section(essay):
+    return f"""
+Essay:
+{essay}
+"""
+
+def build_gemini_prompt(essay, rubric, extra_instructions):
+    with span("prompt_build"):
+        return build_rubric_prefix(rubric, extra_instructions) + build_essay_section(essay)
+
+def parse_grading_response(text):
+    # The grade and feedback from the JSON the grading prompt asks for; raises ValueError when
+    # the model returned something else, including no text at all (a safety block, or
+    # MAX_TOKENS with thinking using the whole budget)
+    if not isinstance(text, str):
+        raise ValueError("The model returned no text")
+    with span("json_parse"):
+        json_result = json.loads(text)
+    if not isinstance(json_result, dict):
+        raise ValueError("The model did not return a JSON object")
+    return {
+        "grade": json_result.get("overall_grade", "N/A"),
+        "feedback": json_result.get("detailed_specific_feedback", "No feedback available"),
+    }
+
+@lru_cache(maxsize=None)
+def get_generate_content_config(thinking_budget=DEFAULT_THINKING_BUDGET):
+    config = build_generate_content_config(thinking_budget)
+    return config, config.model_dump_json(exclude_none=True)
+
+def build_generate_content_config(thinking_budget=DEFAULT_THINKING_BUDGET):
+    from google import genai
+    from google.genai import types
+    return types.GenerateContentConfig(
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=thinking_budget,
         ),
         response_mime_type="application/json",
         response_schema=genai.types.Schema(
@@ -81,9 +106,86 @@ def get_gemini_response(prompt):
             },
         ),
     )
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=contents,
-        config=generate_content_config,
-    )
-    return response.text 
\ No newline at end of file
+
+def build_contents(prompt):
+    from google.genai import types
+    return [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=prompt),
+            ],
+        ),
+    ]
+
+def finish_reason(response):
+    # 'STOP' when the model finished normally; 'MAX_TOKENS', 'SAFETY' etc. otherwise
+    candidates = getattr(response, 'candidates', None)
+    if not candidates or candidates[0].finish_reason is None:
+        return None
+    reason = candidates[0].finish_reason
+    return getattr(reason, 'name', str(reason))
+
+def is_grading_object(text):
+    try:
+        parsed = json.loads(text)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(parsed, dict) and "overall_grade" in parsed and "detailed_specific_feedback" in parsed
+
+def lookup_cached_response(prompt, model, config_json, use_cache=True):
+    # (cached response or None, key to store the new response under or None)
+    if not use_cache:
+        return None, None
+    cache_key = make_cache_key(prompt, model, config_json)
+    with span("response_cache_lookup") as record:
+        cached = get_response_cache().get(cache_key)
+        record["hit"] = cached is not None
+    return cached, cache_key
+
+def store_response(cache_key, text, reason):
+    # Only responses that finished normally and hold the grading object are cached, so a
+    # truncated or unparseable one is requested again next time instead of being replayed
+    if cache_key is None or reason != 'STOP' or not is_grading_object(text):
+        return
+    get_response_cache().set(cache_key, text)
+
+def get_gemini_response(prompt, use_cache=True, model=MODEL_NAME, thinking_budget=DEFAULT_THINKING_BUDGET):
+    generate_content_config, config_json = get_generate_content_config(thinking_budget)
+    cached, cache_key = lookup_cached_response(prompt, model, config_json, use_cache)
+    if cached is not None:
+        return cached
+    with span("gemini_request", model=model, thinking_budget=thinking_budget) as record:
+        response = get_client().models.generate_content(
+            model=model,
+            contents=build_contents(prompt),
+            config=generate_content_config,
+        )
+        record.update(usage_fields(response.usage_metadata))
+    store_response(cache_key, response.text, finish_reason(response))
+    return response.text
+
+def stream_gemini_response(prompt, use_cache=True, model=MODEL_NAME, thinking_budget=DEFAULT_THINKING_BUDGET):
+    generate_content_config, config_json = get_generate_content_config(thinking_budget)
+    cached, cache_key = lookup_cached_response(prompt, model, config_json, use_cache)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    reason = None
+    with span("gemini_request", model=model, thinking_budget=thinking_budget, mode="stream") as record:
+        started = time.perf_counter()
+        for chunk in get_client().models.generate_content_stream(
+            model=model,
+            contents=build_contents(prompt),
+            config=generate_content_config,
+        ):
+            if chunk.usage_metadata is not None:
+                record.update(usage_fields(chunk.usage_metadata))
+            reason = finish_reason(chunk) or reason
+            if chunk.text:
+                if not chunks:
+                    record["first_chunk_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                chunks.append(chunk.text)
+                yield chunk.text
+    store_response(cache_key, ''.join(chunks), reason)
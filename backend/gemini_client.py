@@ -0,0 +1,49 @@
+import os
+import threading
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_TIMEOUT_SECONDS = 120
+
+_client = None
+_client_lock = threading.Lock()
+
+def build_http_options(base_url=None, pool_size=None, timeout_seconds=None):
+    import httpx
+    from google.genai import types
+    base_url = base_url or os.getenv('GEMINI_BASE_URL')
+    pool_size = pool_size or int(os.getenv('GEMINI_POOL_SIZE', DEFAULT_POOL_SIZE))
+    timeout_seconds = timeout_seconds or float(os.getenv('GEMINI_TIMEOUT', DEFAULT_TIMEOUT_SECONDS))
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    return types.HttpOptions(
+        base_url=base_url,
+        timeout=int(timeout_seconds * 1000),
+        client_args={'limits': limits},
+        async_client_args={'limits': limits},
+    )
+
+def create_client(api_key=None, base_url=None, pool_size=None, timeout_seconds=None):
+    api_key = api_key or os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    from google import genai
+    return genai.Client(
+        api_key=api_key,
+        http_options=build_http_options(base_url, pool_size, timeout_seconds),
+    )
+
+def get_client():
+    # One client per process so HTTP keep-alive connections and TLS sessions are reused.
+    # The sync API is client.models and the async API is client.aio.models.
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client()
+        return _client
+
+def set_client(client):
+    global _client
+    with _client_lock:
+        _client = client
+
+def reset_client():
+    set_client(None)
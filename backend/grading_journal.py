@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_SYNC_EVERY = 32
+DEFAULT_SYNC_INTERVAL = 1.0
+FILE_HASH_CHUNK_BYTES = 1024 * 1024
+
+def file_hash(path):
+    # Hash of the raw file, so a restarted run can skip finished essays without extracting them again
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(FILE_HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def rubric_hash(rubric, extra_instructions='', mode=None):
+    digest = hashlib.sha256()
+    for part in (rubric, extra_instructions, mode or ''):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def journal_key(essay_hash, rubric_hash):
+    return f"{essay_hash[:32]}:{rubric_hash[:32]}"
+
+def open_for_append(path):
+    # Appending after a torn last line would glue the next record onto it, so that record
+    # would be skipped too when the file is read back; start a fresh line instead
+    f = open(path, 'a', encoding='utf-8')
+    if f.tell() > 0:
+        with open(path, 'rb') as existing:
+            existing.seek(-1, os.SEEK_END)
+            if existing.read(1) != b'\n':
+                f.write('\n')
+    return f
+
+class GradingJournal:
+    # Append-only write-ahead log of grading requests: one JSON line per 'submitted',
+    # 'completed' or 'failed' event. Lines are flushed immediately but fsynced in batches
+    # (every sync_every events or sync_interval seconds), so a crash loses at most one batch
+    # of completions, and those essays are simply graded again.
+    def __init__(self, path, sync_every=DEFAULT_SYNC_EVERY, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.completed = {}
+        self.failed = {}
+        self.in_flight = {}
+        self._replay()
+        # Keys that were in flight or failed when the previous run stopped; they are retried
+        self.recovered = set(self.in_flight) | set(self.failed)
+        self.file = open_for_append(path)
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write
+                    continue
+                self._apply(record)
+
+    def _apply(self, record):
+        key = record['key']
+        event = record['event']
+        if event == 'submitted':
+            self.in_flight[key] = record['id']
+        elif event == 'completed':
+            self.in_flight.pop(key, None)
+            self.failed.pop(key, None)
+            self.completed[key] = record['result']
+        elif event == 'failed':
+            self.in_flight.pop(key, None)
+            self.failed[key] = record.get('error')
+
+    def _append(self, record):
+        with self.lock:
+            self._apply(record)
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def result_for(self, key):
+        with self.lock:
+            return self.completed.get(key)
+
+    def submitted(self, key, essay_id):
+        self._append({"event": "submitted", "key": key, "id": essay_id, "at": time.time()})
+
+    def complete(self, key, essay_id, result):
+        self._append({"event": "completed", "key": key, "id": essay_id, "at": time.time(), "result": result})
+
+    def fail(self, key, essay_id, error):
+        self._append({"event": "failed", "key": key, "id": essay_id, "at": time.time(), "error": error})
+
+    def stats(self):
+        with self.lock:
+            return {"completed": len(self.completed), "failed": len(self.failed), "in_flight": len(self.in_flight)}
+
+    def sync(self):
+        with self.lock:
+            if self.unsynced:
+                self._sync()
+
+    def close(self):
+        with self.lock:
+            if self.unsynced:
+                self._sync()
+            self.file.close()
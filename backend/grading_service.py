@@ -0,0 +1,366 @@
+import argparse
+import hmac
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+JOB_TYPES = ('grade', 'grammar')
+FINISHED = ('done', 'failed')
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUED = 200
+DEFAULT_MAX_QUEUED_PER_USER = 50
+FINISHED_JOB_TTL = 3600
+MAX_WAIT_SECONDS = 60
+# Essays and rubrics are text; anything larger is refused before it is read
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+class QueueFull(Exception):
+    pass
+
+def run_job(kind, payload):
+    # Module-level so it can run in a worker process as well as a worker thread
+    if kind == 'grade':
+        from backend.context_cache import grade_with_context_cache
+        from backend.gemini_api import parse_grading_response
+        from backend.long_document import grade_long_essay, is_long_essay
+        essay = payload['essay']
+        rubric = payload['rubric']
+        extra = payload.get('extra', '')
+        use_cache = payload.get('use_cache', True)
+        mode = payload.get('mode')
+        if is_long_essay(essay):
+            result = grade_long_essay(essay, rubric, extra, use_cache, mode=mode)
+        else:
+            result = grade_with_context_cache(essay, rubric, extra, use_cache, mode)
+        try:
+            return parse_grading_response(result)
+        except ValueError:
+            raise ValueError(f"Error parsing AI response: {result}")
+    if kind == 'grammar':
+        from backend.file_utils import content_hash
+        from backend.grammar_checker import get_grammar_checker
+        from backend.issue_store import get_issue_store
+        essay = payload['essay']
+        issues = get_grammar_checker().check(essay)
+        get_issue_store().record_issues(content_hash(essay), issues)
+        return {"issues": issues}
+    raise ValueError(f"Unknown job type: {kind}")
+
+class Job:
+    def __init__(self, kind, user, payload):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user = user
+        self.payload = payload
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.kind,
+            "user": self.user,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class FairJobQueue:
+    # One FIFO per user, served round-robin so one user's large batch cannot starve others.
+    # Bounded overall and per user; put() raises QueueFull instead of blocking (backpressure).
+    def __init__(self, max_queued=DEFAULT_MAX_QUEUED, max_queued_per_user=DEFAULT_MAX_QUEUED_PER_USER):
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.queues = OrderedDict()
+        self.size = 0
+        self.condition = threading.Condition()
+
+    def put(self, job):
+        with self.condition:
+            if self.size >= self.max_queued:
+                raise QueueFull("The grading queue is full")
+            user_queue = self.queues.get(job.user)
+            if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+                raise QueueFull(f"Too many queued jobs for user {job.user}")
+            if user_queue is None:
+                user_queue = self.queues[job.user] = deque()
+            user_queue.append(job)
+            self.size += 1
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.size > 0, timeout):
+                return None
+            user, user_queue = next(iter(self.queues.items()))
+            job = user_queue.popleft()
+            # Move the user to the back of the rotation, or drop them once drained
+            del self.queues[user]
+            if user_queue:
+                self.queues[user] = user_queue
+            self.size -= 1
+            return job
+
+    def __len__(self):
+        with self.condition:
+            return self.size
+
+class JobManager:
+    def __init__(self, workers=DEFAULT_WORKERS, worker_type='thread', max_queued=DEFAULT_MAX_QUEUED,
+                 max_queued_per_user=DEFAULT_MAX_QUEUED_PER_USER, runner=run_job):
+        self.queue = FairJobQueue(max_queued, max_queued_per_user)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.runner = runner
+        self.workers = workers
+        self.worker_type = worker_type
+        # With process workers each worker thread hands its job to the pool and waits,
+        # so the number of jobs in flight still equals `workers`
+        self.process_pool = ProcessPoolExecutor(max_workers=workers) if worker_type == 'process' else None
+        self.running = True
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, kind, user, payload):
+        if kind not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {kind}")
+        if not payload.get('essay'):
+            raise ValueError("An essay is required")
+        if kind == 'grade' and not payload.get('rubric'):
+            raise ValueError("A rubric is required")
+        if kind == 'grade':
+            from backend.tiering import resolve_mode
+            resolve_mode(payload.get('mode'))
+        job = Job(kind, user or 'anonymous', payload)
+        with self.lock:
+            self._prune()
+            self.jobs[job.id] = job
+        try:
+            self.queue.put(job)
+        except QueueFull:
+            with self.lock:
+                del self.jobs[job.id]
+            raise
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def wait(self, job_id, timeout, seen_status=None):
+        # Blocks until the job's status differs from seen_status (or it finishes)
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return None
+                if job.status in FINISHED or (seen_status is not None and job.status != seen_status):
+                    return job.to_dict()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job.to_dict()
+                self.changed.wait(remaining)
+
+    def stats(self):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job.status == 'running')
+        return {"queued": len(self.queue), "running": running, "workers": self.workers, "worker_type": self.worker_type}
+
+    def _set_status(self, job, status, **fields):
+        with self.changed:
+            job.status = status
+            for key, value in fields.items():
+                setattr(job, key, value)
+            self.changed.notify_all()
+
+    def _work(self):
+        while self.running:
+            job = self.queue.get(timeout=1)
+            if job is None:
+                continue
+            self._set_status(job, 'running', started_at=time.time())
+            try:
+                if self.process_pool is not None:
+                    result = self.process_pool.submit(self.runner, job.kind, job.payload).result()
+                else:
+                    result = self.runner(job.kind, job.payload)
+            except Exception as e:
+                self._set_status(job, 'failed', error=str(e), finished_at=time.time(), payload=None)
+            else:
+                self._set_status(job, 'done', result=result, finished_at=time.time(), payload=None)
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id in [i for i, j in self.jobs.items() if j.status in FINISHED and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        self.running = False
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+class GradingServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        # With a token configured every route except /health needs "Authorization: Bearer <token>"
+        token = self.server.token
+        if token is None or urlparse(self.path).path == '/health':
+            return True
+        if hmac.compare_digest(self.headers.get('Authorization', ''), f"Bearer {token}"):
+            return True
+        self.send_json(401, {"error": "Missing or invalid token"}, {"WWW-Authenticate": "Bearer"})
+        return False
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if urlparse(self.path).path != '/jobs':
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            if length < 0:
+                self.send_json(400, {"error": "Invalid Content-Length"})
+            else:
+                self.send_json(413, {"error": f"Request body is larger than {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("The request body must be a JSON object")
+            job = self.server.manager.submit(body.get('type', 'grade'), body.get('user'), body)
+        except QueueFull as e:
+            self.send_json(429, {"error": str(e)}, {"Retry-After": "5"})
+        except (ValueError, json.JSONDecodeError) as e:
+            self.send_json(400, {"error": str(e)})
+        else:
+            self.send_json(202, {"id": job.id, "status": job.status}, {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        manager = self.server.manager
+        if parts == ['health']:
+            self.send_json(200, manager.stats())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            self.send_job(manager.get(parts[1]))
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'wait':
+            query = parse_qs(url.query)
+            try:
+                timeout = float(query.get('timeout', ['30'])[0])
+            except ValueError:
+                timeout = math.nan
+            if not math.isfinite(timeout) or timeout < 0:
+                self.send_json(400, {"error": "timeout must be a non-negative number of seconds"})
+                return
+            self.send_job(manager.wait(parts[1], min(timeout, MAX_WAIT_SECONDS), query.get('status', [None])[0]))
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            self.stream_events(parts[1])
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def send_job(self, job):
+        if job is None:
+            self.send_json(404, {"error": "Unknown job"})
+        else:
+            self.send_json(200, job)
+
+    def stream_events(self, job_id):
+        # Server-sent events: one event per status change, ending when the job finishes
+        job = self.server.manager.get(job_id)
+        if job is None:
+            self.send_json(404, {"error": "Unknown job"})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        while True:
+            self.wfile.write(f"data: {json.dumps(job)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            if job['status'] in FINISHED:
+                return
+            job = self.server.manager.wait(job_id, MAX_WAIT_SECONDS, seen_status=job['status'])
+            if job is None:
+                return
+
+class GradingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, manager, token=None):
+        super().__init__(address, GradingServiceHandler)
+        self.manager = manager
+        self.token = token or None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the headless grading service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--worker-type", choices=["thread", "process"], default="thread")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED)
+    parser.add_argument("--max-queued-per-user", type=int, default=DEFAULT_MAX_QUEUED_PER_USER)
+    parser.add_argument("--token", default=None,
+                        help="Require this bearer token on every request except /health (default: GRADER_SERVICE_TOKEN)")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    manager = JobManager(args.workers, args.worker_type, args.max_queued, args.max_queued_per_user)
+    server = GradingServer((args.host, args.port), manager, args.token or os.getenv('GRADER_SERVICE_TOKEN'))
+    print(f"Grading service listening on http://{args.host}:{args.port}/ with {args.workers} {args.worker_type} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import re
+import shutil
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from backend.metrics import span
+
+DEFAULT_LANGUAGE = 'en-US'
+DEFAULT_MAX_CHUNK_CHARS = 1500
+DEFAULT_MAX_WORKERS = 4
+# The public API allows about 20 requests and 75 KB of text per minute, with up to 20 KB per
+# request, so it gets few large chunks sent one at a time
+PUBLIC_API_MAX_CHUNK_CHARS = 18000
+PUBLIC_API_MIN_INTERVAL = 3.0
+PUBLIC_API_MAX_RETRIES = 3
+
+ISSUE_TYPES = {
+    'grammar': 'grammar',
+    'misspelling': 'spelling',
+}
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+# Same attribute names as language_tool_python.Match, so backends are interchangeable
+Match = namedtuple('Match', ['offset', 'errorLength', 'message', 'replacements', 'ruleIssueType', 'ruleId'])
+
+class GrammarCheckUnavailable(Exception):
+    pass
+
+def is_rate_limited(error):
+    # language_tool_python raises RateLimitError in recent versions and a plain
+    # LanguageToolError carrying the response body in older ones
+    return type(error).__name__ == 'RateLimitError' or '429' in str(error) or 'rate limit' in str(error).lower()
+
+class LanguageToolBackend:
+    # mode is 'public' (the LanguageTool public API, the default), 'local' (a LanguageTool
+    # server started once per process; downloads LanguageTool on first use and needs Java) or
+    # the URL of an already running LanguageTool server
+    def __init__(self, mode=None, language=DEFAULT_LANGUAGE):
+        import language_tool_python
+        mode = mode or os.getenv('LANGUAGETOOL_BACKEND') or 'public'
+        # Moved from utils to the exceptions module in language_tool_python 3
+        errors = getattr(language_tool_python, 'exceptions', None) or language_tool_python.utils
+        self.error_type = errors.LanguageToolError
+        try:
+            if mode == 'public':
+                self.tool = language_tool_python.LanguageToolPublicAPI(language)
+            elif mode == 'local':
+                if not shutil.which('java'):
+                    raise GrammarCheckUnavailable("LANGUAGETOOL_BACKEND=local needs Java to run the LanguageTool server")
+                self.tool = language_tool_python.LanguageTool(language)
+            else:
+                self.tool = language_tool_python.LanguageTool(language, remote_server=mode)
+        except self.error_type as e:
+            raise GrammarCheckUnavailable(str(e)) from e
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.last_request = 0.0
+
+    def check(self, text):
+        if self.mode != 'public':
+            try:
+                return self.tool.check(text)
+            except self.error_type as e:
+                raise GrammarCheckUnavailable(str(e)) from e
+        # Public API requests are spaced out and retried with backoff when rate limited
+        attempt = 0
+        while True:
+            with self.lock:
+                wait = self.last_request + PUBLIC_API_MIN_INTERVAL - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                self.last_request = time.monotonic()
+                try:
+                    return self.tool.check(text)
+                except self.error_type as e:
+                    if attempt >= PUBLIC_API_MAX_RETRIES or not is_rate_limited(e):
+                        raise GrammarCheckUnavailable(str(e)) from e
+            time.sleep(PUBLIC_API_MIN_INTERVAL * 2 ** attempt)
+            attempt += 1
+
+    def close(self):
+        self.tool.close()
+
+class RepeatedWordBackend:
+    # Dependency-free stand-in that flags doubled words ("the the")
+    pattern = re.compile(r'\b(\w+)(\s+)\1\b', re.IGNORECASE)
+
+    def check(self, text):
+        return [
+            Match(
+                offset=m.start(),
+                errorLength=m.end() - m.start(),
+                message="Possible typo: you repeated a word.",
+                replacements=[m.group(1)],
+                ruleIssueType='grammar',
+                ruleId='ENGLISH_WORD_REPEAT_RULE',
+            )
+            for m in self.pattern.finditer(text)
+        ]
+
+    def close(self):
+        pass
+
+def _pack_pieces(text, pattern, max_chars):
+    # Greedily packs the pieces between pattern matches into spans of at most max_chars;
+    # separators stay attached so the spans tile the text exactly
+    cuts = [m.end() for m in pattern.finditer(text)] + [len(text)]
+    spans = []
+    span_start = 0
+    previous_cut = 0
+    for cut in cuts:
+        if cut - span_start > max_chars and previous_cut > span_start:
+            spans.append((span_start, previous_cut))
+            span_start = previous_cut
+        previous_cut = cut
+    spans.append((span_start, len(text)))
+    return spans
+
+def split_into_chunks(text, max_chars=DEFAULT_MAX_CHUNK_CHARS):
+    # Returns (offset, chunk) pairs that concatenate back to text, split on paragraph
+    # boundaries first, then sentence boundaries, then hard character limits
+    chunks = []
+    for start, end in _pack_pieces(text, PARAGRAPH_BREAK, max_chars):
+        if end - start <= max_chars:
+            chunks.append((start, text[start:end]))
+            continue
+        paragraph = text[start:end]
+        for s_start, s_end in _pack_pieces(paragraph, SENTENCE_BREAK, max_chars):
+            for h_start in range(s_start, s_end, max_chars):
+                h_end = min(h_start + max_chars, s_end)
+                chunks.append((start + h_start, paragraph[h_start:h_end]))
+    return [(offset, chunk) for offset, chunk in chunks if chunk]
+
+class GrammarChecker:
+    def __init__(self, backend, max_workers=DEFAULT_MAX_WORKERS, max_chunk_chars=DEFAULT_MAX_CHUNK_CHARS):
+        self.backend = backend
+        self.max_chunk_chars = max_chunk_chars
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _check_chunk(self, offset, chunk):
+        with span("languagetool_request", chars=len(chunk)):
+            return [(offset, m) for m in self.backend.check(chunk)]
+
+    def check(self, text):
+        with span("grammar_check", chars=len(text)) as record:
+            chunks = split_into_chunks(text, self.max_chunk_chars)
+            record["chunks"] = len(chunks)
+            if len(chunks) == 1:
+                results = [self._check_chunk(*chunks[0])]
+            else:
+                results = list(self.executor.map(lambda c: self._check_chunk(*c), chunks))
+        issues = []
+        for chunk_matches in results:
+            for chunk_offset, m in chunk_matches:
+                issue_type = ISSUE_TYPES.get(m.ruleIssueType)
+                if issue_type is None:
+                    continue
+                offset = chunk_offset + m.offset
+                issues.append({
+                    'type': issue_type,
+                    'text': text[offset:offset + m.errorLength],
+                    'offset': offset,
+                    'length': m.errorLength,
+                    'message': m.message,
+                    'suggestions': list(m.replacements),
+                    'rule_id': m.ruleId,
+                })
+        issues.sort(key=lambda issue: issue['offset'])
+        return issues
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.backend.close()
+
+_checker = None
+_checker_lock = threading.Lock()
+
+def get_grammar_checker():
+    global _checker
+    with _checker_lock:
+        if _checker is None:
+            backend = RepeatedWordBackend() if os.getenv('LANGUAGETOOL_BACKEND') == 'stub' else LanguageToolBackend()
+            if getattr(backend, 'mode', None) == 'public':
+                # Checked one chunk at a time to stay inside the public API's rate limit
+                _checker = GrammarChecker(backend, max_workers=1, max_chunk_chars=PUBLIC_API_MAX_CHUNK_CHARS)
+            else:
+                _checker = GrammarChecker(backend, max_workers=int(os.getenv('GRAMMAR_CHECK_WORKERS', DEFAULT_MAX_WORKERS)))
+        return _checker
+
+def set_grammar_checker(checker):
+    global _checker
+    with _checker_lock:
+        _checker = checker
@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'grammar_spelling_issues.sqlite3'))
+LEGACY_JSON_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'grammar_spelling_issues.json'))
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS issues ("
+    "id INTEGER PRIMARY KEY, essay_id TEXT NOT NULL, checked_at REAL NOT NULL, type TEXT NOT NULL, "
+    "rule_id TEXT, text TEXT, offset INTEGER, length INTEGER, message TEXT, suggestions TEXT)",
+    "CREATE INDEX IF NOT EXISTS issues_essay_id ON issues (essay_id)",
+    "CREATE INDEX IF NOT EXISTS issues_type_checked_at ON issues (type, checked_at)",
+    "CREATE INDEX IF NOT EXISTS issues_rule_id ON issues (rule_id)",
+    "CREATE INDEX IF NOT EXISTS issues_checked_at ON issues (checked_at)",
+    "CREATE INDEX IF NOT EXISTS issues_type_text ON issues (type, text, essay_id)",
+]
+
+COLUMNS = "id, essay_id, checked_at, type, rule_id, text, offset, length, message, suggestions"
+
+class IssueStore:
+    # Append-only store of grammar and spelling issues; every check adds rows, nothing is rewritten
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def record_issues(self, essay_id, issues, checked_at=None):
+        checked_at = checked_at or time.time()
+        rows = [
+            (
+                essay_id, checked_at, issue['type'], issue.get('rule_id'), issue.get('text'),
+                issue.get('offset'), issue.get('length'), issue.get('message'),
+                json.dumps(issue.get('suggestions') or []),
+            )
+            for issue in issues
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO issues (essay_id, checked_at, type, rule_id, text, offset, length, message, suggestions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def _where(self, issue_type=None, essay_id=None, rule_id=None):
+        clauses = []
+        params = []
+        for column, value in (('type', issue_type), ('essay_id', essay_id), ('rule_id', rule_id)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count_issues(self, issue_type=None, essay_id=None, rule_id=None):
+        where, params = self._where(issue_type, essay_id, rule_id)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM issues{where}", params).fetchone()[0]
+
+    def query_issues(self, issue_type=None, essay_id=None, rule_id=None, limit=50, offset=0):
+        where, params = self._where(issue_type, essay_id, rule_id)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {COLUMNS} FROM issues{where} ORDER BY checked_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [dict(row, suggestions=json.loads(row['suggestions'] or '[]')) for row in rows]
+
+    def most_common_rules(self, issue_type=None, limit=10):
+        where, params = self._where(issue_type)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT rule_id, type, COUNT(*) AS count, MIN(message) AS message FROM issues{where} "
+                "GROUP BY rule_id, type ORDER BY count DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def most_common_misspellings(self, limit=10):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT text, COUNT(*) AS count, COUNT(DISTINCT essay_id) AS essays FROM issues "
+                "WHERE type = 'spelling' GROUP BY text ORDER BY count DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def essay_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(DISTINCT essay_id) FROM issues").fetchone()[0]
+
+    def import_legacy_json(self, path=LEGACY_JSON_PATH):
+        # One-time import of issues saved by the old rewrite-everything JSON file
+        if not os.path.exists(path) or self.count_issues():
+            return 0
+        with open(path, 'r') as f:
+            issues = json.load(f)
+        if not issues:
+            return 0
+        return self.record_issues('legacy', issues, checked_at=os.path.getmtime(path))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_issue_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = IssueStore(os.getenv('ISSUE_STORE_PATH', DEFAULT_DB_PATH))
+            _store.import_legacy_json()
+        return _store
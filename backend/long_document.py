@@ -0,0 +1,199 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.gemini_api import get_gemini_response
+from backend.metrics import span
+from backend.tiering import select_tier
+
+LONG_ESSAY_WORDS = 4000
+MAX_SECTION_WORDS = 1500
+MAX_SECTION_WORKERS = 8
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+HEADING = re.compile(r'^(?:\d+(?:\.\d+)*\.?\s+)?[A-Z][^.!?\n]{0,80}$')
+INTRODUCTION_TITLES = ('introduction', 'intro', 'abstract', 'overview')
+CONCLUSION_TITLES = ('conclusion', 'conclusions', 'summary', 'concluding remarks', 'final thoughts')
+
+def word_count(text):
+    return len(text.split())
+
+def is_long_essay(essay, threshold_words=LONG_ESSAY_WORDS):
+    return word_count(essay) >= threshold_words
+
+def _paragraphs(essay):
+    paragraphs = [p.strip() for p in PARAGRAPH_BREAK.split(essay) if p.strip()]
+    if len(paragraphs) <= 1:
+        paragraphs = [p.strip() for p in essay.splitlines() if p.strip()]
+    return paragraphs
+
+def _is_heading(paragraph):
+    return '\n' not in paragraph and word_count(paragraph) <= 10 and bool(HEADING.match(paragraph))
+
+def _heading_role(title):
+    name = re.sub(r'^[\d.\s]+', '', title).strip().lower()
+    if name in INTRODUCTION_TITLES:
+        return 'introduction'
+    if name in CONCLUSION_TITLES:
+        return 'conclusion'
+    return 'body'
+
+def _pack(paragraphs, max_words):
+    groups = []
+    current = []
+    words = 0
+    for paragraph in paragraphs:
+        paragraph_words = word_count(paragraph)
+        if current and words + paragraph_words > max_words:
+            groups.append(current)
+            current = []
+            words = 0
+        current.append(paragraph)
+        words += paragraph_words
+    if current:
+        groups.append(current)
+    return groups
+
+def split_essay_sections(essay, max_section_words=MAX_SECTION_WORDS):
+    # Splits on headings when the document has them, otherwise treats the first paragraph
+    # as the introduction and the last as the conclusion. Body text is packed into sections
+    # of at most max_section_words so every section is graded in similar time.
+    paragraphs = _paragraphs(essay)
+    if not paragraphs:
+        return []
+    headed = []
+    for paragraph in paragraphs:
+        if _is_heading(paragraph):
+            headed.append({"title": paragraph, "paragraphs": []})
+        elif headed:
+            headed[-1]["paragraphs"].append(paragraph)
+        else:
+            headed.append({"title": None, "paragraphs": [paragraph]})
+    headed = [h for h in headed if h["paragraphs"]]
+    if len(headed) >= 3:
+        blocks = []
+        for index, block in enumerate(headed):
+            role = _heading_role(block["title"]) if block["title"] else ('introduction' if index == 0 else 'body')
+            blocks.append((role, block["title"], block["paragraphs"]))
+    elif len(paragraphs) >= 3:
+        blocks = [
+            ('introduction', None, paragraphs[:1]),
+            ('body', None, paragraphs[1:-1]),
+            ('conclusion', None, paragraphs[-1:]),
+        ]
+    else:
+        blocks = [('body', None, paragraphs)]
+    sections = []
+    for role, title, block_paragraphs in blocks:
+        for part, group in enumerate(_pack(block_paragraphs, max_section_words), 1):
+            sections.append({
+                "index": len(sections) + 1,
+                "role": role,
+                "title": title if part == 1 else (f"{title} (continued)" if title else None),
+                "text": "\n\n".join(group),
+            })
+    return sections
+
+def build_section_prompt(section, section_count, rubric, extra_instructions):
+    label = section["title"] or section["role"].capitalize()
+    return f"""
+You are a highly skilled and fair essay evaluator. You are grading one section of a long student paper that has been split into {section_count} sections. Other evaluators are grading the remaining sections in parallel, and a final step will combine all section assessments into one grade.
+
+Rubric:
+{rubric}
+
+Additional Instructions:
+{extra_instructions if extra_instructions.strip() else 'none'}
+
+This is section {section['index']} of {section_count} ({section['role']}): {label}
+
+For this section only:
+1. overall_grade: The grade this section would earn on its own under the rubric.
+2. detailed_specific_feedback: Concise markdown feedback that quotes exact sentences/phrases from this section, covering strengths, weaknesses and concrete suggestions for each rubric criterion that applies to it.
+
+Keep your response concise and to the point.
+
+Section text:
+{section['text']}
+"""
+
+def build_merge_prompt(sections, section_results, rubric, extra_instructions):
+    assessments = []
+    for section, result in zip(sections, section_results):
+        label = section["title"] or section["role"].capitalize()
+        assessments.append(
+            f"### Section {section['index']} ({section['role']}): {label}\n"
+            f"Section grade: {result.get('overall_grade', 'N/A')}\n\n"
+            f"{result.get('detailed_specific_feedback', '')}"
+        )
+    joined = "\n\n".join(assessments)
+    return f"""
+You are a highly skilled and fair essay evaluator. A long student paper was split into {len(sections)} sections and each section was assessed separately against the rubric. Combine those assessments into a single evaluation of the whole paper.
+
+Rubric:
+{rubric}
+
+Additional Instructions:
+{extra_instructions if extra_instructions.strip() else 'none'}
+
+Section assessments:
+{joined}
+
+IMPORTANT: Your response must include:
+1. Overall Grade: Use the appropriate scoring system based on the rubric, weighing every section
+2. Detailed Specific Feedback: Keep the quotes from the section assessments and structure your feedback in this exact format:
+
+**INTRODUCTION ANALYSIS**
+[Quote specific sentences from the introduction and provide feedback]
+
+**BODY PARAGRAPHS ANALYSIS**
+[Quote specific sentences from each body section and provide feedback]
+
+**CONCLUSION ANALYSIS**
+[Quote specific sentences from the conclusion and provide feedback]
+
+**OVERALL STRENGTHS**
+[Quote specific examples of what was done well]
+
+**AREAS FOR IMPROVEMENT**
+[Quote specific examples and provide concrete suggestions]
+
+**SPECIFIC RECOMMENDATIONS**
+[Provide actionable advice with references to exact parts of the paper]
+
+Return your feedback in markdown format. Keep your response concise and to the point.
+"""
+
+def _parse(result):
+    # Sections that come back without a JSON object are merged as plain text
+    try:
+        parsed = json.loads(result)
+    except (TypeError, json.JSONDecodeError):
+        parsed = None
+    if isinstance(parsed, dict):
+        return parsed
+    return {"overall_grade": "N/A", "detailed_specific_feedback": result or ""}
+
+def grade_long_essay(essay, rubric, extra_instructions, use_cache=True, generate=None, max_workers=MAX_SECTION_WORKERS,
+                     on_section=None, mode=None):
+    # Map: grade every section in parallel. Reduce: one merge call producing the usual
+    # overall_grade / detailed_specific_feedback JSON, so callers handle it like any grade.
+    # Sections are tiered on their own length; the merge is tiered on the whole essay.
+    generate = generate or get_gemini_response
+    sections = split_essay_sections(essay)
+    with span("long_essay_grade", sections=len(sections), words=word_count(essay)):
+        def grade_section(section):
+            tier = select_tier(section["text"], rubric, mode)
+            with span("long_essay_section", role=section["role"]):
+                prompt = build_section_prompt(section, len(sections), rubric, extra_instructions)
+                result = _parse(generate(prompt, use_cache, model=tier.model, thinking_budget=tier.thinking_budget))
+            if on_section is not None:
+                on_section(section, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sections)))) as executor:
+            section_results = list(executor.map(grade_section, sections))
+        tier = select_tier(essay, rubric, mode)
+        with span("long_essay_merge"):
+            prompt = build_merge_prompt(sections, section_results, rubric, extra_instructions)
+            return generate(prompt, use_cache, model=tier.model, thinking_budget=tier.thinking_budget)
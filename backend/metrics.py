@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+DEFAULT_METRICS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.cache', 'metrics.jsonl'))
+RECENT_RECORDS = 5000
+# metrics.jsonl is rotated to metrics.jsonl.1 when it reaches this size (METRICS_MAX_BYTES)
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+# load_records reads at most this much from the end of the file
+TAIL_BYTES = 4 * 1024 * 1024
+
+USAGE_FIELDS = {
+    'prompt_token_count': 'prompt_tokens',
+    'candidates_token_count': 'output_tokens',
+    'thoughts_token_count': 'thinking_tokens',
+    'cached_content_token_count': 'cached_tokens',
+    'total_token_count': 'total_tokens',
+}
+TOKEN_FIELDS = list(USAGE_FIELDS.values())
+
+class MetricsRecorder:
+    # Keeps recent span records in memory and appends every record to a JSONL file, which is
+    # rotated once it reaches max_bytes so at most two files' worth of records are kept
+    def __init__(self, path=DEFAULT_METRICS_PATH, enabled=True, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.recent = deque(maxlen=RECENT_RECORDS)
+        self.lock = threading.Lock()
+        self.file = None
+        self.size = 0
+
+    def record(self, record):
+        if not self.enabled:
+            return
+        line = json.dumps(record)
+        with self.lock:
+            self.recent.append(record)
+            if self.path:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self.file = open(self.path, 'a')
+                    self.size = self.file.tell()
+                self.file.write(line + "\n")
+                self.file.flush()
+                self.size += len(line) + 1
+                if self.size >= self.max_bytes:
+                    self.file.close()
+                    os.replace(self.path, self.path + '.1')
+                    self.file = open(self.path, 'a')
+                    self.size = 0
+
+    @contextmanager
+    def span(self, name, **attrs):
+        record = {"name": name, "ts": time.time(), **attrs}
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.record(record)
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+def get_recorder():
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder(
+                os.getenv('METRICS_PATH', DEFAULT_METRICS_PATH),
+                enabled=os.getenv('METRICS_DISABLED', '') not in ('1', 'true'),
+                max_bytes=int(os.getenv('METRICS_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            )
+        return _recorder
+
+def span(name, **attrs):
+    return get_recorder().span(name, **attrs)
+
+def usage_fields(usage_metadata):
+    if usage_metadata is None:
+        return {}
+    fields = {}
+    for attr, key in USAGE_FIELDS.items():
+        value = getattr(usage_metadata, attr, None)
+        if value is not None:
+            fields[key] = value
+    return fields
+
+def _tail_lines(path, max_bytes):
+    # Complete lines from the last max_bytes of the file
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_bytes))
+        data = f.read()
+    lines = data.split(b'\n')
+    if size > max_bytes:
+        lines = lines[1:]
+    return [line for line in lines if line]
+
+def load_records(path=None, limit=RECENT_RECORDS):
+    # The last `limit` records, read from the end of the current file (and the rotated one
+    # when the current file is short) so page renders do not scan the whole history
+    path = path or get_recorder().path
+    if not path or not os.path.exists(path):
+        return list(get_recorder().recent)
+    lines = _tail_lines(path, TAIL_BYTES)
+    if len(lines) < limit and os.path.exists(path + '.1'):
+        lines = _tail_lines(path + '.1', TAIL_BYTES) + lines
+    records = []
+    for line in lines[-limit:]:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return records
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def summarize(records):
+    by_name = defaultdict(list)
+    for record in records:
+        by_name[record["name"]].append(record)
+    summary = []
+    for name, group in sorted(by_name.items()):
+        durations = sorted(r["ms"] for r in group if "ms" in r)
+        row = {
+            "name": name,
+            "count": len(group),
+            "errors": sum(1 for r in group if "error" in r),
+            "p50_ms": percentile(durations, 0.5),
+            "p95_ms": percentile(durations, 0.95),
+            "max_ms": durations[-1] if durations else None,
+        }
+        for field in TOKEN_FIELDS:
+            values = sorted(r[field] for r in group if field in r)
+            if values:
+                row[f"p50_{field}"] = percentile(values, 0.5)
+                row[f"total_{field}"] = sum(values)
+        # Cache lookups record whether they hit
+        lookups = [r["hit"] for r in group if "hit" in r]
+        if lookups:
+            row["hits"] = sum(lookups)
+            row["hit_rate"] = round(row["hits"] / len(lookups), 3)
+        summary.append(row)
+    return summary
+
+def to_prometheus(summary):
+    # Everything is computed over the window of recent records, so values can go down when old
+    # records leave it: all series are gauges, and the percentiles are plain gauges rather than
+    # summary quantiles
+    lines = [
+        "# HELP essay_grader_recent_spans Spans among the recent records.",
+        "# TYPE essay_grader_recent_spans gauge",
+        "# HELP essay_grader_recent_span_errors Failed spans among the recent records.",
+        "# TYPE essay_grader_recent_span_errors gauge",
+        "# HELP essay_grader_span_latency_p50_ms Median span latency over the recent records.",
+        "# TYPE essay_grader_span_latency_p50_ms gauge",
+        "# HELP essay_grader_span_latency_p95_ms 95th percentile span latency over the recent records.",
+        "# TYPE essay_grader_span_latency_p95_ms gauge",
+        "# HELP essay_grader_recent_tokens Gemini tokens used by the recent records.",
+        "# TYPE essay_grader_recent_tokens gauge",
+        "# HELP essay_grader_recent_cache_hit_ratio Share of the recent cache lookups that hit.",
+        "# TYPE essay_grader_recent_cache_hit_ratio gauge",
+    ]
+    for row in summary:
+        label = f'span="{row["name"]}"'
+        lines.append(f'essay_grader_recent_spans{{{label}}} {row["count"]}')
+        lines.append(f'essay_grader_recent_span_errors{{{label}}} {row["errors"]}')
+        for metric, key in (("essay_grader_span_latency_p50_ms", "p50_ms"), ("essay_grader_span_latency_p95_ms", "p95_ms")):
+            if row[key] is not None:
+                lines.append(f'{metric}{{{label}}} {row[key]}')
+        for field in TOKEN_FIELDS:
+            if f"total_{field}" in row:
+                lines.append(f'essay_grader_recent_tokens{{{label},kind="{field}"}} {row[f"total_{field}"]}')
+        if "hit_rate" in row:
+            lines.append(f'essay_grader_recent_cache_hit_ratio{{{label}}} {row["hit_rate"]}')
+    return "\n".join(lines) + "\n"
+
+def export_prometheus(path, records=None):
+    text = to_prometheus(summarize(records if records is not None else load_records()))
+    with open(path, 'w') as f:
+        f.write(text)
+    return text
@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from backend.file_utils import (
+    content_hash, extract_text, extracted_text_cache, file_extension_of, read_uploaded_file,
+)
+
+SUPPORTED_EXTENSIONS = ('txt', 'docx', 'pdf')
+MIN_PAGES_FOR_PARALLEL = 16
+MIN_PAGES_PER_SHARD = 4
+# Zip uploads are expanded in memory, so the archive is bounded before anything is read
+MAX_ZIP_MEMBERS = 200
+MAX_ZIP_MEMBER_BYTES = 20 * 1024 * 1024
+MAX_ZIP_TOTAL_BYTES = 100 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+class UploadTooLarge(ValueError):
+    pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def worker_count():
+    return int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 1))
+
+def get_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=worker_count())
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+def reset_process_pool(broken):
+    # A worker that crashed (out of memory, a segfault in a PDF library) breaks the whole pool;
+    # it is replaced so later extractions do not keep failing until the app restarts
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _extract_pdf_pages(path, start, stop):
+    import PyPDF2
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() + "\n" for i in range(start, stop)]
+
+def _extract_document(name, data):
+    return extract_text(data, file_extension_of(name))
+
+def shard_ranges(page_count, shards):
+    size = max(MIN_PAGES_PER_SHARD, -(-page_count // shards))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def extract_pdf_parallel(source, max_workers=None):
+    # source is a path or a binary file-like object; workers read pages from a file
+    # path so the document is never pickled once per shard
+    import PyPDF2
+    temp_path = None
+    try:
+        if isinstance(source, str):
+            path = source
+        else:
+            source.seek(0)
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    temp.write(chunk)
+            path = temp_path = temp.name
+        with open(path, 'rb') as f:
+            page_count = len(PyPDF2.PdfReader(f).pages)
+        if page_count < MIN_PAGES_FOR_PARALLEL:
+            return "".join(_extract_pdf_pages(path, 0, page_count))
+        pool = get_process_pool()
+        shards = max_workers or worker_count()
+        try:
+            futures = [pool.submit(_extract_pdf_pages, path, start, stop) for start, stop in shard_ranges(page_count, shards)]
+            return "".join(page for future in futures for page in future.result())
+        except BrokenProcessPool:
+            logger.warning("PDF extraction pool broke; recreating it and extracting in process")
+            reset_process_pool(pool)
+            return "".join(_extract_pdf_pages(path, 0, page_count))
+    except Exception:
+        logger.warning("Could not extract text from PDF", exc_info=True)
+        return None
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+def iter_zip_documents(zip_source):
+    with zipfile.ZipFile(zip_source) as archive:
+        members = [
+            info for info in sorted(archive.infolist(), key=lambda i: i.filename)
+            if not (info.is_dir() or os.path.basename(info.filename).startswith(('.', '~$')) or info.filename.startswith('__MACOSX/'))
+            and file_extension_of(info.filename) in SUPPORTED_EXTENSIONS
+        ]
+        if len(members) > MAX_ZIP_MEMBERS:
+            raise UploadTooLarge(f"The zip archive holds {len(members)} essays; at most {MAX_ZIP_MEMBERS} are accepted")
+        total = 0
+        for info in members:
+            # The sizes in the zip directory are not trusted: members are read with a limit
+            with archive.open(info) as member:
+                data = member.read(MAX_ZIP_MEMBER_BYTES + 1)
+            if len(data) > MAX_ZIP_MEMBER_BYTES:
+                raise UploadTooLarge(f"{info.filename} is larger than {MAX_ZIP_MEMBER_BYTES // (1024 * 1024)} MB")
+            total += len(data)
+            if total > MAX_ZIP_TOTAL_BYTES:
+                raise UploadTooLarge(f"The zip archive expands to more than {MAX_ZIP_TOTAL_BYTES // (1024 * 1024)} MB")
+            yield info.filename, data
+
+def extract_many(documents):
+    # documents is a list of (name, bytes); results come back in input order
+    pool = get_process_pool()
+    try:
+        futures = [(name, pool.submit(_extract_document, name, data)) for name, data in documents]
+        return [(name, future.result()) for name, future in futures]
+    except BrokenProcessPool:
+        logger.warning("Extraction pool broke; recreating it and extracting in process")
+        reset_process_pool(pool)
+        return [(name, _extract_document(name, data)) for name, data in documents]
+
+def read_uploaded_files(uploaded_files):
+    # One or more uploads (zip archives are expanded) as separate essays: [(name, text)] in
+    # upload order. Files that yield no text are left out.
+    if not uploaded_files:
+        return []
+    if not isinstance(uploaded_files, (list, tuple)):
+        uploaded_files = [uploaded_files]
+    if len(uploaded_files) == 1 and file_extension_of(uploaded_files[0].name) != 'zip':
+        text = read_uploaded_file(uploaded_files[0])
+        return [(uploaded_files[0].name, text)] if text else []
+    documents = []
+    for uploaded_file in uploaded_files:
+        if file_extension_of(uploaded_file.name) == 'zip':
+            uploaded_file.seek(0)
+            documents.extend(iter_zip_documents(uploaded_file))
+        else:
+            documents.append((uploaded_file.name, uploaded_file.getvalue()))
+    # Each document is cached on its own, so adding a file to the upload only extracts that file
+    essays = [None] * len(documents)
+    pending = []
+    for index, (name, data) in enumerate(documents):
+        key = (content_hash(data), file_extension_of(name))
+        text = extracted_text_cache.get(key)
+        if text is not None:
+            essays[index] = (name, text)
+        else:
+            pending.append((index, key, name, data))
+    extracted = extract_many([(name, data) for _, _, name, data in pending])
+    for (index, key, name, _), (_, text) in zip(pending, extracted):
+        if text:
+            extracted_text_cache.set(key, text)
+            essays[index] = (name, text)
+    return [essay for essay in essays if essay]
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.cache', 'gemini_responses.sqlite3'))
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+def make_cache_key(prompt, model, config_json):
+    digest = hashlib.sha256()
+    for part in (model, config_json, prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                if row is not None:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, response):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode('utf-8')), now, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        if self.max_age:
+            self.conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Drop least recently used entries until both limits are satisfied
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(os.getenv('GEMINI_CACHE_PATH', DEFAULT_CACHE_PATH))
+        return _cache
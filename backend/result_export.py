@@ -0,0 +1,282 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# The sections the grading prompt asks for, in order
+FEEDBACK_SECTIONS = (
+    "INTRODUCTION ANALYSIS",
+    "BODY PARAGRAPHS ANALYSIS",
+    "CONCLUSION ANALYSIS",
+    "OVERALL STRENGTHS",
+    "AREAS FOR IMPROVEMENT",
+    "SPECIFIC RECOMMENDATIONS",
+)
+OTHER_SECTION = "OTHER"
+# A line that is only a bold title ("**OVERALL STRENGTHS**") or a markdown heading
+SECTION_HEADING = re.compile(r'^\s*(?:#{1,6}\s+)?\*\*(?P<bold>[^*]+?):?\*\*\s*:?\s*$|^\s*#{1,6}\s+(?P<plain>.+?)\s*$')
+CSV_FIELDS = ("id", "path", "status", "grade", "seconds", "duplicate_of", "similarity", "error")
+UNSAFE_FILENAME = re.compile(r'[^\w.-]+')
+# The app's results log is compacted to the latest result per essay whenever it has doubled
+# in size since the last compaction (and is at least this big)
+APP_LOG_MIN_COMPACT_BYTES = 1024 * 1024
+
+ZIP_COMPRESSION_LEVEL = 6
+ZIP_DEFLATED = 8
+ZIP_UTF8_FLAG = 0x800
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+ZIP_MAX_16 = 0xFFFF
+ZIP_MAX_32 = 0xFFFFFFFF
+# Archives with this many entries, or offsets this large, switch to ZIP64 records
+ZIP_FILECOUNT_LIMIT = ZIP_MAX_16
+ZIP64_LIMIT = ZIP_MAX_32
+ZIP_LOCAL_HEADER = 0x04034b50
+ZIP_CENTRAL_HEADER = 0x02014b50
+ZIP_END_RECORD = 0x06054b50
+ZIP64_END_RECORD = 0x06064b50
+ZIP64_END_LOCATOR = 0x07064b50
+
+def section_column(title):
+    return title.lower().replace(' ', '_')
+
+def split_feedback_sections(feedback):
+    # [(title, text)] in document order; text before the first heading has the title None
+    sections = []
+    title = None
+    lines = []
+    for line in (feedback or '').splitlines():
+        match = SECTION_HEADING.match(line)
+        if match:
+            if title is not None or any(l.strip() for l in lines):
+                sections.append((title, '\n'.join(lines).strip()))
+            title = (match.group('bold') or match.group('plain')).strip()
+            lines = []
+        else:
+            lines.append(line)
+    if title is not None or any(l.strip() for l in lines):
+        sections.append((title, '\n'.join(lines).strip()))
+    return sections
+
+def feedback_columns(feedback):
+    # Known sections get their own column; anything else is collected under 'other'
+    columns = {section_column(title): '' for title in FEEDBACK_SECTIONS + (OTHER_SECTION,)}
+    for title, text in split_feedback_sections(feedback):
+        key = section_column(title.upper()) if title and title.upper() in FEEDBACK_SECTIONS else section_column(OTHER_SECTION)
+        if title and key == section_column(OTHER_SECTION):
+            text = f"**{title}**\n{text}"
+        columns[key] = f"{columns[key]}\n\n{text}".strip() if columns[key] else text
+    return columns
+
+def _dos_timestamp(t):
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+def feedback_markdown(result):
+    lines = [f"# {result['id']}", "", f"**Overall Grade:** {result.get('grade', 'N/A')}", ""]
+    for title, text in split_feedback_sections(result.get('feedback', '')):
+        if title:
+            lines += [f"## {title.title()}", ""]
+        lines += [text, ""]
+    return "\n".join(lines)
+
+class CsvExporter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.fields = CSV_FIELDS + tuple(section_column(t) for t in FEEDBACK_SECTIONS + (OTHER_SECTION,))
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, result):
+        self.writer.writerow({**result, **feedback_columns(result.get('feedback'))})
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class JsonlExporter:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, result):
+        sections = [{"title": title, "text": text} for title, text in split_feedback_sections(result.get('feedback'))]
+        self.file.write(json.dumps({**result, "sections": sections}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ZipFeedbackExporter:
+    # One markdown feedback file per graded essay, compressed and written as it arrives.
+    # zipfile.ZipFile keeps every entry's metadata in memory until close(), so the central
+    # directory records and the names already used are kept in a temporary on-disk SQLite
+    # database instead and copied to the end of the archive on close.
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.offset = 0
+        self.entries = 0
+        self.spill = sqlite3.connect('')
+        self.spill.execute("CREATE TABLE names (name TEXT PRIMARY KEY)")
+        # Next suffix to try for each base name, so repeated ids do not probe every earlier suffix
+        self.spill.execute("CREATE TABLE suffixes (base TEXT PRIMARY KEY, next INTEGER NOT NULL)")
+        self.spill.execute("CREATE TABLE central_directory (record BLOB NOT NULL)")
+
+    def _unique_name(self, result):
+        base = UNSAFE_FILENAME.sub('_', str(result['id'])).strip('._')[:100] or 'essay'
+        row = self.spill.execute("SELECT next FROM suffixes WHERE base = ?", (base,)).fetchone()
+        counter = row[0] if row else 1
+        # Still checked against the names in use: an id like 'essay_2' can take a suffixed name
+        while True:
+            name = f"{base}.md" if counter == 1 else f"{base}_{counter}.md"
+            if self.spill.execute("INSERT OR IGNORE INTO names (name) VALUES (?)", (name,)).rowcount:
+                break
+            counter += 1
+        self.spill.execute("INSERT OR REPLACE INTO suffixes (base, next) VALUES (?, ?)", (base, counter + 1))
+        return name
+
+    def write(self, result):
+        if result.get('status') != 'ok':
+            return
+        name = self._unique_name(result).encode('utf-8')
+        data = feedback_markdown(result).encode('utf-8')
+        compressor = zlib.compressobj(ZIP_COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(data) + compressor.flush()
+        crc = zlib.crc32(data)
+        dos_time, dos_date = _dos_timestamp(time.localtime())
+        common = struct.pack('<HHHHIII', ZIP_UTF8_FLAG, ZIP_DEFLATED, dos_time, dos_date, crc, len(compressed), len(data))
+        self.file.write(struct.pack('<IH', ZIP_LOCAL_HEADER, ZIP_VERSION) + common + struct.pack('<HH', len(name), 0) + name)
+        self.file.write(compressed)
+        extra = b''
+        offset = self.offset
+        if offset >= ZIP64_LIMIT:
+            extra = struct.pack('<HHQ', 0x0001, 8, offset)
+            offset = ZIP_MAX_32
+        version = ZIP64_VERSION if extra else ZIP_VERSION
+        record = (
+            struct.pack('<IHH', ZIP_CENTRAL_HEADER, version, version) + common
+            + struct.pack('<HHHHHII', len(name), len(extra), 0, 0, 0, 0o644 << 16, offset) + name + extra
+        )
+        self.spill.execute("INSERT INTO central_directory (record) VALUES (?)", (record,))
+        self.offset += 30 + len(name) + len(compressed)
+        self.entries += 1
+
+    def close(self):
+        directory_offset = self.offset
+        directory_size = 0
+        for (record,) in self.spill.execute("SELECT record FROM central_directory ORDER BY rowid"):
+            self.file.write(record)
+            directory_size += len(record)
+        self.spill.close()
+        entries, size, offset = self.entries, directory_size, directory_offset
+        if entries >= ZIP_FILECOUNT_LIMIT or size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT:
+            zip64_offset = directory_offset + directory_size
+            self.file.write(struct.pack(
+                '<IQHHIIQQQQ', ZIP64_END_RECORD, 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0, entries, entries, size, offset,
+            ))
+            self.file.write(struct.pack('<IIQI', ZIP64_END_LOCATOR, 0, zip64_offset, 1))
+            entries, size, offset = ZIP_MAX_16, ZIP_MAX_32, ZIP_MAX_32
+        self.file.write(struct.pack('<IHHHHIIH', ZIP_END_RECORD, 0, 0, entries, entries, size, offset, 0))
+        self.file.close()
+
+class BulkExporter:
+    # Fans each result out to the requested formats as soon as it is available; nothing is
+    # kept in memory between results
+    def __init__(self, csv_path=None, jsonl_path=None, zip_path=None):
+        self.exporters = []
+        self.lock = threading.Lock()
+        if csv_path:
+            self.exporters.append(CsvExporter(csv_path))
+        if jsonl_path:
+            self.exporters.append(JsonlExporter(jsonl_path))
+        if zip_path:
+            self.exporters.append(ZipFeedbackExporter(zip_path))
+        self.count = 0
+
+    def __call__(self, result):
+        with self.lock:
+            for exporter in self.exporters:
+                exporter.write(result)
+            self.count += 1
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+def read_results(lines):
+    # Parses results JSONL (batch grader output) one line at a time
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def iter_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from read_results(f)
+
+def export_results(results, csv_path=None, jsonl_path=None, zip_path=None):
+    exporter = BulkExporter(csv_path, jsonl_path, zip_path)
+    try:
+        for result in results:
+            exporter(result)
+    finally:
+        exporter.close()
+    return exporter.count
+
+_log_lock = threading.Lock()
+_compacted_sizes = {}
+
+def _compact(path):
+    # Called with _log_lock held
+    latest = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            try:
+                latest[json.loads(line)['id']] = number
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+    keep = set(latest.values())
+    with open(path, 'r', encoding='utf-8') as src, open(path + '.tmp', 'w', encoding='utf-8') as dst:
+        for number, line in enumerate(src):
+            if number in keep:
+                dst.write(line)
+    os.replace(path + '.tmp', path)
+    _compacted_sizes[path] = os.path.getsize(path)
+    return len(keep)
+
+def compact_results(path):
+    # Rewrites a results log keeping only the latest result for each essay id, so regrades
+    # replace the earlier grade instead of exporting as extra rows
+    with _log_lock:
+        return _compact(path)
+
+def append_result(path, result):
+    # Used by the app to keep a log of every essay it grades, so they can be exported together
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _log_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({**result, "graded_at": time.time()}) + "\n")
+            size = f.tell()
+        if size >= max(APP_LOG_MIN_COMPACT_BYTES, 2 * _compacted_sizes.get(path, 0)):
+            _compact(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export grading results to CSV, JSONL or a zip of feedback files.")
+    parser.add_argument("results", help="Results JSONL written by the batch grader")
+    parser.add_argument("--csv", default=None, help="CSV file with one row per essay and one column per feedback section")
+    parser.add_argument("--jsonl", default=None, help="JSONL file with the feedback split into sections")
+    parser.add_argument("--zip", default=None, help="Zip archive with one markdown feedback file per essay")
+    args = parser.parse_args(argv)
+    if not (args.csv or args.jsonl or args.zip):
+        parser.error("Choose at least one of --csv, --jsonl or --zip")
+    count = export_results(iter_results(args.results), args.csv, args.jsonl, args.zip)
+    print(f"Exported {count} results")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from backend.grading_service import FINISHED
+
+class ServiceError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class GradingServiceClient:
+    def __init__(self, base_url, timeout=30, token=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token = token
+
+    def _request(self, method, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', str(e))
+            except ValueError:
+                message = str(e)
+            raise ServiceError(message, e.code) from e
+        except urllib.error.URLError as e:
+            raise ServiceError(f"Grading service unavailable: {e.reason}") from e
+
+    def submit_grade(self, essay, rubric, extra="", user=None, use_cache=True, mode=None):
+        return self._request('POST', '/jobs', {
+            "type": "grade", "user": user, "essay": essay, "rubric": rubric, "extra": extra, "use_cache": use_cache,
+            "mode": mode,
+        })["id"]
+
+    def submit_grammar(self, essay, user=None):
+        return self._request('POST', '/jobs', {"type": "grammar", "user": user, "essay": essay})["id"]
+
+    def get_job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def wait_for_job(self, job_id, timeout=600, poll_seconds=25, on_status=None):
+        # Long-polls the service until the job finishes. With on_status each poll returns as
+        # soon as the status changes (queued -> running) and the callback is given the job.
+        deadline = time.monotonic() + timeout
+        seen_status = None
+        if on_status is not None:
+            job = self.get_job(job_id)
+            seen_status = job['status']
+            on_status(job)
+            if seen_status in FINISHED:
+                return job
+        while True:
+            remaining = deadline - time.monotonic()
+            wait = max(1, min(poll_seconds, remaining))
+            path = f'/jobs/{job_id}/wait?timeout={wait:.0f}'
+            if seen_status is not None:
+                path += f'&status={seen_status}'
+            job = self._request('GET', path, timeout=wait + self.timeout)
+            if on_status is not None and job['status'] != seen_status:
+                seen_status = job['status']
+                on_status(job)
+            if job['status'] in FINISHED:
+                return job
+            if remaining <= 0:
+                raise ServiceError(f"Timed out waiting for job {job_id}")
+
+    def run(self, job_id, timeout=600, on_status=None):
+        job = self.wait_for_job(job_id, timeout, on_status=on_status)
+        if job['status'] == 'failed':
+            raise ServiceError(job['error'])
+        return job['result']
+
+    def health(self):
+        return self._request('GET', '/health')
+
+def get_service_client():
+    # The app runs as a thin client of the grading service when GRADER_SERVICE_URL is set
+    url = os.getenv('GRADER_SERVICE_URL')
+    return GradingServiceClient(url, token=os.getenv('GRADER_SERVICE_TOKEN')) if url else None
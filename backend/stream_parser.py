@@ -0,0 +1,101 @@
+import json
+
+# Incremental parser for the flat JSON object returned by the grading schema, e.g.
+# {"overall_grade": "B+", "detailed_specific_feedback": "..."}. Chunks can split the
+# text anywhere (inside keys, values or escape sequences); partially received string
+# values are exposed through `values` as soon as their first characters arrive.
+class StreamingJsonParser:
+    def __init__(self):
+        self.values = {}
+        self.completed = set()
+        self.done = False
+        self.state = 'start'
+        self.key = None
+        self.buffer = []
+        self.escape = None
+        self.raw = []
+
+    @property
+    def text(self):
+        return ''.join(self.raw)
+
+    def feed(self, chunk):
+        self.raw.append(chunk)
+        for ch in chunk:
+            self._consume(ch)
+        if self.state == 'string':
+            self.values[self.key] = ''.join(self.buffer)
+        return self.values
+
+    def _consume(self, ch):
+        state = self.state
+        if state in ('key', 'string'):
+            self._consume_string_char(ch)
+        elif state == 'scalar':
+            if ch in ',}':
+                self.values[self.key] = json.loads(''.join(self.buffer).strip())
+                self.completed.add(self.key)
+                self.state = 'after_value'
+                self._consume(ch)
+            else:
+                self.buffer.append(ch)
+        elif ch.isspace():
+            return
+        elif state == 'start':
+            if ch == '{':
+                self.state = 'key_or_end'
+        elif state == 'key_or_end':
+            if ch == '"':
+                self.state = 'key'
+                self.buffer = []
+            elif ch == '}':
+                self.state = 'done'
+                self.done = True
+        elif state == 'colon':
+            if ch == ':':
+                self.state = 'value'
+        elif state == 'value':
+            self.buffer = []
+            if ch == '"':
+                self.state = 'string'
+                self.values[self.key] = ''
+            else:
+                self.state = 'scalar'
+                self.buffer.append(ch)
+        elif state == 'after_value':
+            if ch == ',':
+                self.state = 'key_or_end'
+            elif ch == '}':
+                self.state = 'done'
+                self.done = True
+
+    def _consume_string_char(self, ch):
+        if self.escape is not None:
+            self.escape += ch
+            if self.escape[0] == 'u' and len(self.escape) < 5:
+                return
+            self._append(json.loads('"\\' + self.escape + '"'))
+            self.escape = None
+        elif ch == '\\':
+            self.escape = ''
+        elif ch == '"':
+            value = ''.join(self.buffer)
+            if self.state == 'key':
+                self.key = value
+                self.state = 'colon'
+            else:
+                self.values[self.key] = value
+                self.completed.add(self.key)
+                self.state = 'after_value'
+            self.buffer = []
+        else:
+            self.buffer.append(ch)
+
+    def _append(self, decoded):
+        # Join UTF-16 surrogate pairs that arrive as two separate \u escapes
+        if self.buffer and len(decoded) == 1 and 0xDC00 <= ord(decoded) <= 0xDFFF:
+            high = self.buffer[-1]
+            if len(high) == 1 and 0xD800 <= ord(high) <= 0xDBFF:
+                self.buffer[-1] = chr(0x10000 + ((ord(high) - 0xD800) << 10) + (ord(decoded) - 0xDC00))
+                return
+        self.buffer.append(decoded)
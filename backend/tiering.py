@@ -0,0 +1,64 @@
+import os
+import re
+from collections import namedtuple
+
+from backend.gemini_api import DEFAULT_THINKING_BUDGET, MODEL_NAME
+
+Tier = namedtuple('Tier', ['model', 'thinking_budget'])
+
+FAST_MODEL_NAME = "gemini-2.5-flash-lite"
+MODES = ('fast', 'balanced', 'thorough')
+# Dynamic thinking, as before tiering. Fast and Balanced are opt-in until a live evaluation
+# (python -m benchmarks.tiering_eval --live) shows their agreement with Thorough is acceptable.
+DEFAULT_MODE = 'thorough'
+
+# Cheapest to most thorough. thinking_budget=-1 lets the model decide how long to think,
+# which is what every essay used before tiering and is what 'thorough' still does.
+TIER_LADDER = (
+    Tier(FAST_MODEL_NAME, 0),
+    Tier(MODEL_NAME, 0),
+    Tier(MODEL_NAME, 512),
+    Tier(MODEL_NAME, 1024),
+    Tier(MODEL_NAME, 2048),
+    Tier(MODEL_NAME, 4096),
+    Tier(MODEL_NAME, DEFAULT_THINKING_BUDGET),
+)
+MODE_BASE_LEVEL = {'fast': 0, 'balanced': 2}
+
+SHORT_ESSAY_WORDS = 400
+MEDIUM_ESSAY_WORDS = 1500
+COMPLEX_RUBRIC_CRITERIA = 8
+COMPLEX_RUBRIC_WORDS = 400
+
+CRITERION_LINE = re.compile(r'^\s*(?:[-*•]|\d+[.)]|[A-Za-z][\w /&-]{0,40}:)')
+
+def rubric_criteria_count(rubric):
+    # Bulleted, numbered or "Name:" lines; a table-free rubric in prose counts as one criterion
+    return max(1, sum(1 for line in rubric.splitlines() if CRITERION_LINE.match(line)))
+
+def is_complex_rubric(rubric):
+    return rubric_criteria_count(rubric) >= COMPLEX_RUBRIC_CRITERIA or len(rubric.split()) >= COMPLEX_RUBRIC_WORDS
+
+def length_bucket(essay):
+    words = len(essay.split())
+    if words < SHORT_ESSAY_WORDS:
+        return 0
+    if words < MEDIUM_ESSAY_WORDS:
+        return 1
+    return 2
+
+def resolve_mode(mode=None):
+    # GRADING_MODE sets the default for callers that do not pass a mode
+    mode = mode or os.getenv('GRADING_MODE', DEFAULT_MODE)
+    if mode not in MODES:
+        raise ValueError(f"Unknown grading mode: {mode} (expected one of {', '.join(MODES)})")
+    return mode
+
+def select_tier(essay, rubric, mode=None):
+    # Longer essays and more detailed rubrics each move one step up the ladder from the
+    # mode's starting point; 'thorough' always uses the top tier
+    mode = resolve_mode(mode)
+    if mode == 'thorough':
+        return TIER_LADDER[-1]
+    level = MODE_BASE_LEVEL[mode] + length_bucket(essay) + (1 if is_complex_rubric(rubric) else 0)
+    return TIER_LADDER[min(level, len(TIER_LADDER) - 1)]
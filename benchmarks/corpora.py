@@ -0,0 +1,127 @@
+import io
+import random
+
+WORD_COUNTS = (200, 1000, 5000, 20000)
+
+VOCABULARY = (
+    "analysis argument author balance character claim community conflict context culture debate "
+    "decision democracy development economy education effect environment evidence example experience "
+    "freedom future government history idea identity impact individual influence information justice "
+    "knowledge language leader literature memory narrative nature opinion perspective policy power "
+    "problem progress reader research responsibility result science society solution source story "
+    "structure student technology theme theory tradition truth value voice world writer"
+).split()
+FILLER = "the a of and to in that is was for with as on by it this which their these".split()
+INTRO_OPENERS = ("In this essay I argue that", "This essay examines how", "Many people believe that")
+BODY_OPENERS = ("For example,", "Furthermore,", "In addition,", "On the other hand,", "Similarly,")
+CONCLUSION_OPENERS = ("In conclusion,", "To summarize,", "Ultimately,")
+
+def _sentence(rng, opener=None):
+    words = [rng.choice(FILLER) if rng.random() < 0.4 else rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.05:
+        # Occasional doubled word so grammar checks have something to find
+        index = rng.randrange(len(words))
+        words.insert(index, words[index])
+    text = " ".join(words)
+    if opener:
+        text = f"{opener} {text}"
+    return text[0].upper() + text[1:] + "."
+
+def _paragraph(rng, opener):
+    sentences = [_sentence(rng, opener)] + [_sentence(rng) for _ in range(rng.randint(3, 6))]
+    return " ".join(sentences)
+
+def generate_essay(word_count, seed=0):
+    # Intro, body paragraphs and conclusion, trimmed to roughly word_count words
+    rng = random.Random(seed)
+    paragraphs = [_paragraph(rng, rng.choice(INTRO_OPENERS))]
+    words = len(paragraphs[0].split())
+    conclusion = _paragraph(rng, rng.choice(CONCLUSION_OPENERS))
+    target = max(word_count - len(conclusion.split()), 0)
+    while words < target:
+        paragraph = _paragraph(rng, rng.choice(BODY_OPENERS))
+        paragraphs.append(paragraph)
+        words += len(paragraph.split())
+    paragraphs.append(conclusion)
+    return "\n\n".join(paragraphs)
+
+def generate_rubric():
+    criteria = ("Thesis", "Evidence", "Organization", "Style", "Conventions")
+    lines = ["Score each criterion from 1 to 4 and give a final letter grade (A-F)."]
+    for criterion in criteria:
+        lines.append(f"{criterion}: 4 = excellent, 3 = proficient, 2 = developing, 1 = beginning.")
+    return "\n".join(lines)
+
+def to_txt_bytes(text):
+    return text.encode("utf-8")
+
+def to_docx_bytes(text):
+    from docx import Document
+    document = Document()
+    for paragraph in text.split("\n\n"):
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def _wrap(text, width):
+    lines = []
+    for paragraph in text.split("\n\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        lines.append("")
+    return lines
+
+def to_pdf_bytes(text, lines_per_page=50, width=90):
+    # Minimal hand-written PDF (Helvetica text pages) so no PDF writer library is needed
+    lines = _wrap(text, width)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_lines in pages:
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in page_lines]
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        stream = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+DOCUMENT_WRITERS = {
+    "txt": to_txt_bytes,
+    "docx": to_docx_bytes,
+    "pdf": to_pdf_bytes,
+}
+
+class SyntheticUpload(io.BytesIO):
+    # Stands in for Streamlit's UploadedFile (a BytesIO with a name)
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
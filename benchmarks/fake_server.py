@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.fake_gemini_server import DEFAULT_RESPONSE, FakeGeminiHandler, FakeGeminiServer
+
+ERRORS = {
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+}
+
+class BenchmarkHandler(FakeGeminiHandler):
+    def handle_body(self, body):
+        error = self.server.pick_error()
+        time.sleep(self.server.latency)
+        if error is not None:
+            self.send_json(error, {"error": {"code": error, "message": "Injected error", "status": ERRORS[error]}})
+            return
+        if ':generateContent' in self.path:
+            time.sleep(self.server.generation_seconds(body))
+        super().handle_body(body)
+
+class BenchmarkServer(FakeGeminiServer):
+    # Fake generateContent endpoint with a fixed time to first token, an output token
+    # rate and a seeded error rate split evenly across 429/500/503
+    def __init__(self, address=('127.0.0.1', 0), latency_ms=200, tokens_per_second=400, error_rate=0.0, seed=0, response=None):
+        super().__init__(address, response=response, handler=BenchmarkHandler)
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def pick_error(self):
+        if not self.error_rate:
+            return None
+        with self.random_lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            return self.random.choice(list(ERRORS))
+
+    def generation_seconds(self, body):
+        if not self.tokens_per_second:
+            return 0
+        return len(self.response_text(body).split()) / self.tokens_per_second
+
+    def build_stream(self, body):
+        for event in super().build_stream(body):
+            if self.tokens_per_second:
+                text = event["candidates"][0]["content"]["parts"][0]["text"]
+                time.sleep(len(text.split()) / self.tokens_per_second)
+            yield event
+
+def start_benchmark_server(**kwargs):
+    server = BenchmarkServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark fake Gemini server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    server = BenchmarkServer(
+        (args.host, args.port), args.latency_ms, args.tokens_per_second, args.error_rate, args.seed, DEFAULT_RESPONSE,
+    )
+    print(f"Benchmark fake Gemini server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Loaded on first use only; importing any module below must not pull these in
+HEAVY_DEPENDENCIES = ('google.genai', 'PyPDF2', 'docx', 'pyperclip', 'language_tool_python', 'toml')
+COLD_START_MODULES = (
+    'backend.file_utils',
+    'backend.parallel_extract',
+    'backend.gemini_api',
+    'backend.context_cache',
+    'backend.long_document',
+    'backend.batch_grader',
+    'backend.grammar_checker',
+    'backend.grading_service',
+    'backend.service_client',
+    'backend.clipboard_utils',
+    'backend.duplicate_index',
+    'backend.result_export',
+    'backend.tiering',
+    'frontend.app',
+)
+
+def import_profile(module):
+    # Imports the module in a fresh interpreter with -X importtime and parses the report
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv('PYTHONPATH')])))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=ROOT, env=env,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    imported = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported[name.strip()] = int(cumulative)
+    heavy = sorted({
+        dependency for dependency in HEAVY_DEPENDENCIES for name in imported
+        if name == dependency or name.startswith(dependency + '.')
+    })
+    slowest = sorted(
+        ((name, us) for name, us in imported.items() if name != module and '.' not in name),
+        key=lambda item: -item[1],
+    )[:5]
+    return {
+        "module": module,
+        "import_ms": round(imported.get(module, 0) / 1000, 3),
+        "heavy_imports": heavy,
+        "slowest_ms": {name: round(us / 1000, 3) for name, us in slowest},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report cold import time per module and flag eagerly imported heavy dependencies.")
+    parser.add_argument("modules", nargs="*", default=list(COLD_START_MODULES))
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a module imports a heavy dependency")
+    args = parser.parse_args(argv)
+
+    profiles = [import_profile(module) for module in args.modules]
+    for profile in profiles:
+        heavy = f"  HEAVY: {', '.join(profile['heavy_imports'])}" if profile['heavy_imports'] else ""
+        print(f"{profile['module']:<28} {profile['import_ms']:>9.1f}ms{heavy}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(profiles, f, indent=2)
+    if args.check and any(profile['heavy_imports'] for profile in profiles):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
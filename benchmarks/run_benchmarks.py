@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.corpora import (
+    DOCUMENT_WRITERS, WORD_COUNTS, SyntheticUpload, generate_essay, generate_rubric,
+)
+from benchmarks.fake_server import start_benchmark_server
+from benchmarks.import_times import COLD_START_MODULES, import_profile
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def measure(func, iterations, warmup=1):
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def case_result(name, params, durations, items_per_call=1, **extra):
+    ordered = sorted(durations)
+    total = sum(durations)
+    return {
+        "name": name,
+        "params": params,
+        "iterations": len(durations),
+        "throughput_per_s": round(items_per_call * len(durations) / total, 3) if total else None,
+        "p50_ms": round(percentile(ordered, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+class SlowBackend:
+    # Adds a fixed round-trip and per-character cost to a grammar backend, like a LanguageTool server
+    def __init__(self, backend, round_trip_ms=50, ms_per_1000_chars=20):
+        self.backend = backend
+        self.round_trip = round_trip_ms / 1000
+        self.per_char = ms_per_1000_chars / 1000 / 1000
+
+    def check(self, text):
+        time.sleep(self.round_trip + len(text) * self.per_char)
+        return self.backend.check(text)
+
+    def close(self):
+        self.backend.close()
+
+def bench_extraction(word_counts, iterations):
+    from backend.file_utils import extracted_text_cache, read_uploaded_file
+    results = []
+    for file_type, writer in DOCUMENT_WRITERS.items():
+        for word_count in word_counts:
+            data = writer(generate_essay(word_count, seed=word_count))
+            params = {"file_type": file_type, "words": word_count, "bytes": len(data)}
+            upload = SyntheticUpload(f"essay.{file_type}", data)
+
+            def read_cold():
+                # Hashing, the cache miss and extraction, as on a new upload
+                extracted_text_cache.clear()
+                return read_uploaded_file(upload)
+
+            durations = measure(read_cold, iterations)
+            results.append(case_result("read_uploaded_file.cold", params, durations))
+            durations = measure(lambda: read_uploaded_file(upload), iterations)
+            results.append(case_result("read_uploaded_file.memoized", params, durations))
+    return results
+
+def bench_prompt_build(word_counts, iterations):
+    from backend.gemini_api import build_gemini_prompt
+    rubric = generate_rubric()
+    results = []
+    for word_count in word_counts:
+        essay = generate_essay(word_count, seed=word_count)
+        durations = measure(lambda: build_gemini_prompt(essay, rubric, ""), iterations * 10)
+        results.append(case_result("build_gemini_prompt", {"words": word_count}, durations))
+    return results
+
+def bench_gemini_request(server, iterations):
+    from backend.gemini_api import build_gemini_prompt, get_gemini_response, stream_gemini_response
+    prompt = build_gemini_prompt(generate_essay(1000), generate_rubric(), "")
+    results = []
+    durations = measure(lambda: get_gemini_response(prompt, use_cache=False), iterations)
+    results.append(case_result("get_gemini_response", {"cache": False}, durations))
+    get_gemini_response(prompt)
+    durations = measure(lambda: get_gemini_response(prompt), iterations)
+    results.append(case_result("get_gemini_response", {"cache": True}, durations))
+    first_chunks = []
+
+    def stream_once():
+        started = time.perf_counter()
+        for index, _ in enumerate(stream_gemini_response(prompt, use_cache=False)):
+            if index == 0:
+                first_chunks.append(time.perf_counter() - started)
+
+    durations = measure(stream_once, iterations)
+    first_chunks = sorted(first_chunks)
+    results.append(case_result(
+        "stream_gemini_response", {"cache": False}, durations,
+        first_chunk_p50_ms=round(percentile(first_chunks, 0.5) * 1000, 3),
+    ))
+    return results
+
+def bench_batch(essay_count, concurrency_levels, error_rate):
+    from backend.batch_grader import grade_batch
+    rubric = generate_rubric()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        essays = []
+        for index in range(essay_count):
+            path = os.path.join(directory, f"essay_{index:04d}.txt")
+            with open(path, 'w') as f:
+                f.write(generate_essay(500, seed=index))
+            essays.append((f"essay_{index:04d}", path))
+        for concurrency in concurrency_levels:
+            latencies = []
+            started = time.perf_counter()
+            batch_results = grade_batch(essays, rubric, "", concurrency=concurrency, max_retries=5, use_cache=False)
+            elapsed = time.perf_counter() - started
+            latencies = [r["seconds"] for r in batch_results if r["status"] == "ok"]
+            failed = sum(1 for r in batch_results if r["status"] != "ok")
+            result = case_result(
+                "grade_batch", {"essays": essay_count, "concurrency": concurrency, "error_rate": error_rate},
+                latencies or [elapsed], failed=failed,
+            )
+            result["throughput_per_s"] = round(essay_count / elapsed, 3)
+            results.append(result)
+    return results
+
+def bench_grammar(word_counts, iterations):
+    from backend.grammar_checker import GrammarChecker, RepeatedWordBackend
+    results = []
+    for word_count in word_counts:
+        essay = generate_essay(word_count, seed=word_count)
+        for workers in (1, 8):
+            checker = GrammarChecker(SlowBackend(RepeatedWordBackend()), max_workers=workers)
+            durations = measure(lambda: checker.check(essay), iterations)
+            results.append(case_result("grammar_check", {"words": word_count, "workers": workers}, durations))
+            checker.close()
+    return results
+
+def bench_imports(iterations):
+    # Cold import of each entry module in a fresh interpreter; heavy_imports must stay empty
+    results = []
+    for module in COLD_START_MODULES:
+        profiles = [import_profile(module) for _ in range(iterations)]
+        durations = [profile["import_ms"] / 1000 for profile in profiles]
+        results.append(case_result(
+            "cold_import", {"module": module}, durations, heavy_imports=profiles[-1]["heavy_imports"],
+        ))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite against a fake Gemini server.")
+    parser.add_argument("--output", default="bench_results.json", help="Machine-readable results file")
+    parser.add_argument("--quick", action="store_true", help="Smaller corpora and fewer iterations")
+    parser.add_argument("--iterations", type=int, default=None)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--only", nargs="*", default=None, help="Run only these groups: imports extraction prompt gemini batch grammar")
+    args = parser.parse_args(argv)
+
+    word_counts = WORD_COUNTS[:2] if args.quick else WORD_COUNTS
+    iterations = args.iterations or (3 if args.quick else 10)
+    batch_size = args.batch_size or (20 if args.quick else 100)
+    groups = set(args.only or ["imports", "extraction", "prompt", "gemini", "batch", "grammar"])
+
+    server = start_benchmark_server(
+        latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second, error_rate=0.0,
+    )
+    cache_dir = tempfile.mkdtemp(prefix="essay-grader-bench-")
+    os.environ.update({
+        "GEMINI_API_KEY": "benchmark",
+        "GEMINI_BASE_URL": server.url,
+        "GEMINI_CACHE_PATH": os.path.join(cache_dir, "responses.sqlite3"),
+        "METRICS_DISABLED": "1",
+    })
+
+    results = []
+    if "imports" in groups:
+        results += bench_imports(iterations)
+    if "extraction" in groups:
+        results += bench_extraction(word_counts, iterations)
+    if "prompt" in groups:
+        results += bench_prompt_build(word_counts, iterations)
+    if "gemini" in groups:
+        results += bench_gemini_request(server, iterations)
+    if "batch" in groups:
+        server.error_rate = args.error_rate
+        results += bench_batch(batch_size, (1, 4, 16), args.error_rate)
+        server.error_rate = 0.0
+    if "grammar" in groups:
+        results += bench_grammar(word_counts, iterations)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fake_server": {
+            "latency_ms": args.latency_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "error_rate": args.error_rate,
+            "requests": len(server.requests),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for result in results:
+        print(f"{result['name']:<32} {json.dumps(result['params']):<60} p50={result['p50_ms']:>10.3f}ms p95={result['p95_ms']:>10.3f}ms {result['throughput_per_s']}/s")
+    print(f"Results written to {args.output}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
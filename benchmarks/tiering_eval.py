@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.tiering import MODES, FAST_MODEL_NAME, TIER_LADDER, is_complex_rubric, select_tier
+from benchmarks.corpora import generate_essay, generate_rubric
+from benchmarks.run_benchmarks import git_commit, percentile
+
+EVAL_WORD_COUNTS = (150, 300, 600, 1000, 2000, 3500)
+LETTERS = "ABCDF"
+
+def generate_complex_rubric():
+    criteria = (
+        "Thesis", "Evidence", "Analysis", "Counterarguments", "Organization", "Transitions",
+        "Style", "Word choice", "Conventions", "Citations",
+    )
+    lines = ["Score each criterion from 1 to 4, weight Analysis and Evidence double, and give a final letter grade (A-F)."]
+    for criterion in criteria:
+        lines.append(f"{criterion}: 4 = excellent, 3 = proficient, 2 = developing, 1 = beginning.")
+    return "\n".join(lines)
+
+def letter_grade(score):
+    for letter, cutoff in zip(LETTERS, (90, 80, 70, 60)):
+        if score >= cutoff:
+            return letter
+    return "F"
+
+def grade_distance(a, b):
+    # Steps between two letter grades ("B+" counts as B); None when either is not a letter grade
+    a, b = str(a).strip()[:1].upper(), str(b).strip()[:1].upper()
+    if a not in LETTERS or b not in LETTERS:
+        return None
+    return abs(LETTERS.index(a) - LETTERS.index(b))
+
+class StubGradingBackend:
+    # Offline stand-in for Gemini. Each essay has a hidden true score; a tier grades it with
+    # noise that grows when the model is smaller or thinks less than the essay needs, and
+    # reports the latency the request would take (round trip + prefill + decode), without sleeping.
+    # Dynamic thinking overshoots what the essay needs by a fixed amount, as it does in practice.
+    MODEL_PROFILES = {
+        # model: (round trip s, prefill tokens/s, decode tokens/s, noise sd in points)
+        FAST_MODEL_NAME: (0.25, 20000, 500, 5.0),
+        TIER_LADDER[-1].model: (0.4, 10000, 250, 3.0),
+    }
+    OUTPUT_TOKENS = 600
+    DYNAMIC_THINKING_OVERHEAD = 1000
+
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def _rng(self, *parts):
+        digest = hashlib.sha256("\0".join(str(p) for p in (self.seed,) + parts).encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def thinking_needed(self, essay, rubric):
+        needed = 200 + 0.8 * len(essay.split())
+        return needed * 1.5 if is_complex_rubric(rubric) else needed
+
+    def grade(self, essay, rubric, tier, run=0):
+        round_trip, prefill_rate, decode_rate, noise = self.MODEL_PROFILES[tier.model]
+        needed = self.thinking_needed(essay, rubric)
+        dynamic = needed * 1.2 + self.DYNAMIC_THINKING_OVERHEAD
+        thinking = dynamic if tier.thinking_budget < 0 else min(tier.thinking_budget, dynamic)
+        shortfall = max(0.0, needed - thinking) / needed
+        essay_rng = self._rng(essay)
+        true_score = essay_rng.uniform(55, 98)
+        # Shared error term: every tier tends to misjudge the same essay the same way
+        shared = essay_rng.gauss(0, 1)
+        own = self._rng(essay, tier.model, tier.thinking_budget, run).gauss(0, 1)
+        sd = noise * (1 + 2 * shortfall)
+        score = true_score + sd * (0.7 * shared + 0.71 * own)
+        prompt_tokens = (len(essay) + len(rubric)) / 4
+        seconds = round_trip + prompt_tokens / prefill_rate + (thinking + self.OUTPUT_TOKENS) / decode_rate
+        return letter_grade(score), letter_grade(true_score), seconds
+
+class LiveGradingBackend:
+    # Times real requests through get_gemini_response; there is no reference grade
+    def __init__(self, extra="", use_cache=False):
+        self.extra = extra
+        self.use_cache = use_cache
+
+    def grade(self, essay, rubric, tier, run=0):
+        from backend.gemini_api import build_gemini_prompt, get_gemini_response
+        prompt = build_gemini_prompt(essay, rubric, self.extra)
+        started = time.perf_counter()
+        result = get_gemini_response(prompt, self.use_cache, model=tier.model, thinking_budget=tier.thinking_budget)
+        seconds = time.perf_counter() - started
+        try:
+            grade = json.loads(result).get("overall_grade", "N/A")
+        except json.JSONDecodeError:
+            grade = "N/A"
+        return grade, None, seconds
+
+def synthetic_corpus(essays_per_length):
+    corpus = []
+    for rubric_name, rubric in (("simple", generate_rubric()), ("complex", generate_complex_rubric())):
+        for word_count in EVAL_WORD_COUNTS:
+            for index in range(essays_per_length):
+                essay_id = f"{rubric_name}-{word_count}-{index}"
+                corpus.append((essay_id, generate_essay(word_count, seed=word_count * 1000 + index), rubric))
+    return corpus
+
+def file_corpus(essays_source, rubric_path):
+    from backend.batch_grader import load_essays
+    from backend.file_utils import read_file_path
+    rubric = read_file_path(rubric_path)
+    if not rubric:
+        raise SystemExit(f"Could not read rubric file: {rubric_path}")
+    corpus = []
+    for essay_id, path in load_essays(essays_source):
+        essay = read_file_path(path)
+        if essay:
+            corpus.append((essay_id, essay, rubric))
+    return corpus
+
+def evaluate(corpus, backend, modes=MODES):
+    # Grades every essay in every mode and compares each mode with 'thorough' (today's behaviour).
+    # 'thorough' is graded a second time so its agreement with itself gives the run-to-run
+    # baseline: a mode that matches that baseline is not shifting grades.
+    runs = [(mode, mode, 0) for mode in modes]
+    if 'thorough' in modes:
+        runs.insert(0, ('thorough', 'thorough (repeat)', 1))
+    graded = {}
+    references = {}
+    for mode, label, run in runs:
+        graded[label] = {}
+        for essay_id, essay, rubric in corpus:
+            tier = select_tier(essay, rubric, mode)
+            grade, reference, seconds = backend.grade(essay, rubric, tier, run)
+            graded[label][essay_id] = (grade, seconds, tier)
+            references[essay_id] = reference
+    summary = []
+    for mode in graded:
+        latencies = sorted(seconds for _, seconds, _ in graded[mode].values())
+        row = {
+            "mode": mode,
+            "essays": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "tiers": {},
+        }
+        for _, _, tier in graded[mode].values():
+            label = f"{tier.model}/{tier.thinking_budget}"
+            row["tiers"][label] = row["tiers"].get(label, 0) + 1
+        if 'thorough' in graded and mode != 'thorough':
+            pairs = [(graded[mode][i][0], graded['thorough'][i][0]) for i in graded[mode]]
+            row["agreement_with_thorough"] = round(sum(a == b for a, b in pairs) / len(pairs), 3)
+            distances = [grade_distance(a, b) for a, b in pairs]
+            distances = [d for d in distances if d is not None]
+            if distances:
+                row["within_one_of_thorough"] = round(sum(d <= 1 for d in distances) / len(distances), 3)
+        if any(r is not None for r in references.values()):
+            pairs = [(graded[mode][i][0], references[i]) for i in graded[mode]]
+            row["agreement_with_reference"] = round(sum(a == b for a, b in pairs) / len(pairs), 3)
+        summary.append(row)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare grading modes: latency against grade agreement.")
+    parser.add_argument("--output", default="tiering_results.json")
+    parser.add_argument("--essays-per-length", type=int, default=20, help="Synthetic essays per length and rubric")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--live", action="store_true", help="Send real requests to Gemini instead of the stub backend")
+    parser.add_argument("--essays", default=None, help="Directory or manifest of real essays (with --rubric)")
+    parser.add_argument("--rubric", default=None)
+    args = parser.parse_args(argv)
+
+    if args.essays:
+        if not args.rubric:
+            parser.error("--essays requires --rubric")
+        corpus = file_corpus(args.essays, args.rubric)
+    else:
+        corpus = synthetic_corpus(args.essays_per_length)
+    if args.live:
+        from dotenv import load_dotenv
+        load_dotenv()
+        backend = LiveGradingBackend()
+    else:
+        backend = StubGradingBackend(args.seed)
+
+    summary = evaluate(corpus, backend)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "backend": "live" if args.live else "stub",
+        "essays": len(corpus),
+        "results": summary,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for row in summary:
+        agreement = row.get("agreement_with_thorough")
+        print(
+            f"{row['mode']:<18} p50={row['p50_ms']:>9.1f}ms p95={row['p95_ms']:>9.1f}ms "
+            f"agree_with_thorough={agreement if agreement is not None else '-':<6} "
+            f"agree_with_reference={row.get('agreement_with_reference', '-')}"
+        )
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
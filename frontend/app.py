@@ -1,14 +1,28 @@
 import sys
 import os
+import time
+import queue
+import io
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
 from dotenv import load_dotenv
-import json
-from backend.gemini_api import build_gemini_prompt, get_gemini_response
-from backend.file_utils import read_uploaded_file, load_user_settings, save_user_settings, save_grammar_spelling_issues, load_grammar_spelling_issues
+from backend.gemini_api import build_gemini_prompt, parse_grading_response, stream_gemini_response
+from backend.stream_parser import StreamingJsonParser
+from backend.file_utils import content_hash, load_user_settings, save_user_settings
+from backend.parallel_extract import UploadTooLarge, read_uploaded_files
 from backend.clipboard_utils import copy_to_clipboard
-import language_tool_python
-import toml
+from backend.grammar_checker import get_grammar_checker, GrammarCheckUnavailable
+from backend.issue_store import get_issue_store
+from backend.long_document import grade_long_essay, is_long_essay, split_essay_sections
+from backend.service_client import ServiceError, get_service_client
+from backend.metrics import export_prometheus, load_records, span, summarize
+from backend.tiering import MODES, resolve_mode, select_tier
+from backend.duplicate_index import assignment_key, essay_diff, get_duplicate_index
+from backend.result_export import append_result, compact_results, export_results, iter_results, read_results
 
 load_dotenv()
 
@@ -20,61 +34,115 @@ if 'rubric' not in st.session_state:
     st.session_state.rubric = ""
 if 'extra' not in st.session_state:
     st.session_state.extra = ""
+if 'essay_name' not in st.session_state:
+    st.session_state.essay_name = None
+if 'duplicate_match' not in st.session_state:
+    st.session_state.duplicate_match = None
+if 'export_dir' not in st.session_state:
+    st.session_state.export_dir = None
 
-def apply_theme():
-    # Read theme from user settings and update .streamlit/config.toml
-    settings_path = os.path.join(os.path.dirname(__file__), '../user_settings.json')
-    config_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.streamlit'))
-    config_path = os.path.join(config_dir, 'config.toml')
-    if not os.path.exists(config_dir):
-        os.makedirs(config_dir)
+SETTINGS_PATH = os.path.join(os.path.dirname(__file__), '../user_settings.json')
+STREAMLIT_CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.streamlit/config.toml'))
+# Every essay graded in the app is appended here so the whole class can be exported at once
+APP_RESULTS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.cache/app_results.jsonl'))
+EXPORT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.cache/exports'))
+EXPORT_FORMATS = {
+    "CSV (one row per essay)": ("grades.csv", "text/csv"),
+    "JSONL (feedback split into sections)": ("grades.jsonl", "application/jsonl"),
+    "Zip of feedback files (one per student)": ("feedback.zip", "application/zip"),
+}
+DEFAULT_THEME = 'Dark Blue'
+THEME_PRESETS = {
+    'Dark Blue': {
+        'base': 'dark',
+        'primaryColor': '#1f77b4',
+        'backgroundColor': '#18191A',
+        'secondaryBackgroundColor': '#23272F',
+        'textColor': '#f8f9fa',
+    },
+    'Dark Green': {
+        'base': 'dark',
+        'primaryColor': '#2ecc40',
+        'backgroundColor': '#18191A',
+        'secondaryBackgroundColor': '#23272F',
+        'textColor': '#f8f9fa',
+    },
+    'Light Blue': {
+        'base': 'light',
+        'primaryColor': '#1f77b4',
+        'backgroundColor': '#f8f9fa',
+        'secondaryBackgroundColor': '#f0f2f6',
+        'textColor': '#222',
+    },
+    'Light Green': {
+        'base': 'light',
+        'primaryColor': '#2ecc40',
+        'backgroundColor': '#f8f9fa',
+        'secondaryBackgroundColor': '#f0f2f6',
+        'textColor': '#222',
+    },
+}
+
+@st.cache_data(show_spinner=False)
+def load_settings():
+    # Read once per process; save_settings clears the cache after writing
     try:
-        settings = load_user_settings(settings_path)
-        theme = settings.get('theme', 'Dark Blue')
-    except Exception:
-        theme = 'Dark Blue'
-    theme_presets = {
-        'Dark Blue': {
-            'base': 'dark',
-            'primaryColor': '#1f77b4',
-            'backgroundColor': '#18191A',
-            'secondaryBackgroundColor': '#23272F',
-            'textColor': '#f8f9fa',
-        },
-        'Dark Green': {
-            'base': 'dark',
-            'primaryColor': '#2ecc40',
-            'backgroundColor': '#18191A',
-            'secondaryBackgroundColor': '#23272F',
-            'textColor': '#f8f9fa',
-        },
-        'Light Blue': {
-            'base': 'light',
-            'primaryColor': '#1f77b4',
-            'backgroundColor': '#f8f9fa',
-            'secondaryBackgroundColor': '#f0f2f6',
-            'textColor': '#222',
-        },
-        'Light Green': {
-            'base': 'light',
-            'primaryColor': '#2ecc40',
-            'backgroundColor': '#f8f9fa',
-            'secondaryBackgroundColor': '#f0f2f6',
-            'textColor': '#222',
-        },
-    }
-    preset = theme_presets.get(theme, theme_presets['Dark Blue'])
-    config = {
-        'theme': {
-            'base': preset['base'],
-            'primaryColor': preset['primaryColor'],
-            'backgroundColor': preset['backgroundColor'],
-            'secondaryBackgroundColor': preset['secondaryBackgroundColor'],
-            'textColor': preset['textColor'],
-        }
-    }
-    with open(config_path, 'w') as f:
-        toml.dump(config, f)
+        return load_user_settings(SETTINGS_PATH)
+    except (OSError, ValueError):
+        return {}
+
+def save_settings(settings):
+    if settings == load_settings():
+        return False
+    save_user_settings(settings, SETTINGS_PATH)
+    load_settings.clear()
+    return True
+
+def apply_theme(theme):
+    # Update .streamlit/config.toml, writing only when the theme differs from what is on disk.
+    # Not cached: switching back to an earlier theme has to rewrite the file.
+    import toml
+    preset = THEME_PRESETS.get(theme, THEME_PRESETS[DEFAULT_THEME])
+    content = toml.dumps({'theme': dict(preset)})
+    try:
+        with open(STREAMLIT_CONFIG_PATH, 'r') as f:
+            if f.read() == content:
+                return
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(STREAMLIT_CONFIG_PATH), exist_ok=True)
+    with open(STREAMLIT_CONFIG_PATH, 'w') as f:
+        f.write(content)
+
+JOB_STATUS_LABELS = {
+    "queued": "⏳ Queued on the grading service...",
+    "running": "⚙️ Running on the grading service...",
+}
+
+def show_job_status(status, job):
+    if job["status"] in JOB_STATUS_LABELS:
+        status.update(label=JOB_STATUS_LABELS[job["status"]])
+
+def current_user():
+    # Identifies the teacher to the grading service so its queue can share workers fairly
+    return load_settings().get("name") or "anonymous"
+
+def extract_uploads(key, uploaded_files):
+    # [(name, text)], one per essay. Memoized per upload using Streamlit's file ids, so reruns
+    # neither hash nor parse the files again
+    if not uploaded_files:
+        return []
+    files = uploaded_files if isinstance(uploaded_files, list) else [uploaded_files]
+    file_ids = tuple(f.file_id for f in files)
+    cached = st.session_state.get(f"{key}_extracted")
+    if cached is not None and cached[0] == file_ids:
+        return cached[1]
+    try:
+        essays = read_uploaded_files(uploaded_files)
+    except (UploadTooLarge, zipfile.BadZipFile) as e:
+        st.error(f"Could not read the upload: {e}")
+        return []
+    st.session_state[f"{key}_extracted"] = (file_ids, essays)
+    return essays
 
 def main():
     st.title("AI Essay Grader ✍️")
@@ -84,8 +152,7 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
-    # Always apply dark mode with blue accent
-    apply_theme()
+    apply_theme(load_settings().get('theme', DEFAULT_THEME))
 
     # Target word count input (now on main page)
     st.markdown("#### Target Word Count (optional)")
@@ -105,12 +172,18 @@ def main():
             if essay_input_method == "Text Input":
                 essay = st.text_area("Student Essay", height=150, value=st.session_state.essay, key="essay_input")
                 st.session_state.essay = essay
+                st.session_state.essay_name = None
             else:
-                uploaded_essay = st.file_uploader("Upload Essay File", type=['txt', 'docx', 'pdf'], key="essay_upload")
-                essay = read_uploaded_file(uploaded_essay)
-                if uploaded_essay:
-                    st.success(f"✅ Uploaded: {uploaded_essay.name}")
-                    st.session_state.essay = essay
+                uploaded_essays = st.file_uploader("Upload Essay File(s)", type=['txt', 'docx', 'pdf', 'zip'], accept_multiple_files=True, key="essay_upload")
+                essays = extract_uploads("essay_upload", uploaded_essays)
+                if essays:
+                    st.success(f"✅ Uploaded {len(essays)} essay{'s' if len(essays) > 1 else ''}")
+                    # Several files or a zip are separate essays; one is graded at a time here
+                    # (use the batch grader to grade a whole class)
+                    index = 0
+                    if len(essays) > 1:
+                        index = st.selectbox("Essay to grade", range(len(essays)), format_func=lambda i: essays[i][0], key="essay_select")
+                    st.session_state.essay_name, st.session_state.essay = essays[index]
 
     # Word count metric and progress bar
     essay = st.session_state.essay
@@ -125,69 +198,42 @@ def main():
     # Grammar and spelling checks
     if essay:
         if st.button("Check Grammar & Spelling", key="grammar_check"):
-            import time
-            progress_placeholder = st.empty()
-            animation_placeholder = st.empty()
-            for i in range(10):
-                progress_placeholder.progress((i+1)*10, text=f"Checking... {(i+1)*10}%")
-                animation_placeholder.markdown(
-                    f"<div style='text-align:center; font-size:2em;'>🔎 <span style='animation: bounce 1s infinite;'>{'.' * ((i % 3) + 1)}</span></div>"
-                    "<style>@keyframes bounce {0%, 100% {transform: translateY(0);} 50% {transform: translateY(-10px);}}</style>",
-                    unsafe_allow_html=True
-                )
-                time.sleep(0.05)
+            status = st.status("🔎 Checking grammar & spelling...")
             try:
-                tool = language_tool_python.LanguageToolPublicAPI('en-US')
-                matches = tool.check(essay)
-                grammar_issues = [m for m in matches if m.ruleIssueType == 'grammar']
-                spelling_issues = [m for m in matches if m.ruleIssueType == 'misspelling']
-                all_issues = []
-                for m in grammar_issues:
-                    all_issues.append({
-                        'type': 'grammar',
-                        'text': essay[m.offset:m.offset + m.errorLength],
-                        'offset': m.offset,
-                        'message': m.message,
-                        'suggestions': m.replacements
-                    })
-                for m in spelling_issues:
-                    all_issues.append({
-                        'type': 'spelling',
-                        'text': essay[m.offset:m.offset + m.errorLength],
-                        'offset': m.offset,
-                        'message': m.message,
-                        'suggestions': m.replacements
-                    })
-                save_grammar_spelling_issues(all_issues)
-                progress_placeholder.empty()
-                animation_placeholder.empty()
+                service = get_service_client()
+                if service is not None:
+                    job_id = service.submit_grammar(essay, user=current_user())
+                    all_issues = service.run(job_id, on_status=lambda job: show_job_status(status, job))["issues"]
+                else:
+                    all_issues = get_grammar_checker().check(essay)
+                    status.update(label="🔎 Saving issues to the database...")
+                    get_issue_store().record_issues(content_hash(essay), all_issues)
+                grammar_issues = [i for i in all_issues if i['type'] == 'grammar']
+                spelling_issues = [i for i in all_issues if i['type'] == 'spelling']
+                status.update(label=f"🔎 Grammar & spelling checked: {len(all_issues)} issues", state="complete")
                 if grammar_issues or spelling_issues:
                     st.markdown("### 📝 Grammar & Spelling Checks")
                     if grammar_issues:
                         st.warning(f"Grammar issues found: {len(grammar_issues)}")
-                        for m in grammar_issues[:5]:
-                            error_text = essay[m.offset:m.offset + m.errorLength]
-                            suggestions = ', '.join(m.replacements) if m.replacements else 'No suggestions'
-                            st.markdown(f"- **{error_text}** (at position {m.offset}): {m.message} <br>**Suggestions:** {suggestions}", unsafe_allow_html=True)
+                        for issue in grammar_issues[:5]:
+                            suggestions = ', '.join(issue['suggestions']) if issue['suggestions'] else 'No suggestions'
+                            st.markdown(f"- **{issue['text']}** (at position {issue['offset']}): {issue['message']} <br>**Suggestions:** {suggestions}", unsafe_allow_html=True)
                         if len(grammar_issues) > 5:
                             st.markdown(f"...and {len(grammar_issues) - 5} more.")
                     if spelling_issues:
                         st.warning(f"Spelling issues found: {len(spelling_issues)}")
-                        for m in spelling_issues[:5]:
-                            error_text = essay[m.offset:m.offset + m.errorLength]
-                            suggestions = ', '.join(m.replacements) if m.replacements else 'No suggestions'
-                            st.markdown(f"- **{error_text}** (at position {m.offset}): {m.message} <br>**Suggestions:** {suggestions}", unsafe_allow_html=True)
+                        for issue in spelling_issues[:5]:
+                            suggestions = ', '.join(issue['suggestions']) if issue['suggestions'] else 'No suggestions'
+                            st.markdown(f"- **{issue['text']}** (at position {issue['offset']}): {issue['message']} <br>**Suggestions:** {suggestions}", unsafe_allow_html=True)
                         if len(spelling_issues) > 5:
                             st.markdown(f"...and {len(spelling_issues) - 5} more.")
                 else:
                     st.success("No grammar or spelling issues detected!")
-            except language_tool_python.utils.LanguageToolError as e:
-                progress_placeholder.empty()
-                animation_placeholder.empty()
+            except (GrammarCheckUnavailable, ServiceError):
+                status.update(label="🔎 Grammar & spelling check failed", state="error")
                 st.error("Grammar & spelling check service is currently unavailable. Please try again later.")
             except Exception as e:
-                progress_placeholder.empty()
-                animation_placeholder.empty()
+                status.update(label="🔎 Grammar & spelling check failed", state="error")
                 st.error(f"Unexpected error: {e}")
 
     with st.expander("📋 Rubric Input", expanded=True):
@@ -200,7 +246,7 @@ def main():
                 st.session_state.rubric = rubric
             else:
                 uploaded_rubric = st.file_uploader("Upload Rubric File", type=['txt', 'docx', 'pdf'], key="rubric_upload")
-                rubric = read_uploaded_file(uploaded_rubric)
+                rubric = "\n\n".join(text for _, text in extract_uploads("rubric_upload", uploaded_rubric))
                 if uploaded_rubric:
                     st.success(f"✅ Uploaded: {uploaded_rubric.name}")
                     st.session_state.rubric = rubric
@@ -210,6 +256,16 @@ def main():
                             placeholder="Any specific grading criteria or instructions...", 
                             value=st.session_state.extra, key="extra_input")
         st.session_state.extra = extra
+        bypass_cache = st.checkbox("Bypass response cache (always request a fresh grade)", value=False, key="bypass_cache")
+        reuse_duplicates = st.checkbox(
+            "Reuse the grade of an identical essay (ignoring case, punctuation and whitespace) graded earlier with this rubric",
+            value=False, key="reuse_duplicates",
+        )
+        grading_mode = st.radio(
+            "Grading mode", MODES, index=MODES.index(resolve_mode()), horizontal=True, key="grading_mode",
+            format_func=str.capitalize,
+            help="Fast and Balanced use a smaller thinking budget (and a lighter model for short essays) for quicker results; Thorough always thinks as long as the model needs.",
+        )
 
     # Centered Grade button
     st.markdown("<div style='text-align:center;'>", unsafe_allow_html=True)
@@ -224,36 +280,136 @@ def main():
         if not essay or not rubric:
             st.error("Please provide both the essay and rubric.")
             return
-        # Progress bar and animation
-        progress_placeholder = st.empty()
-        animation_placeholder = st.empty()
-        import time
-        progress = 0
-        for i in range(10):
-            progress += 10
-            progress_placeholder.progress(progress, text=f"Grading... {progress}%")
-            animation_placeholder.markdown(
-                f"<div style='text-align:center; font-size:2em;'>🧠 <span style='animation: bounce 1s infinite;'>{'.' * ((i % 3) + 1)}</span></div>"
-                "<style>@keyframes bounce {0%, 100% {transform: translateY(0);} 50% {transform: translateY(-10px);}}</style>",
-                unsafe_allow_html=True
-            )
-            time.sleep(0.08)
-        with st.spinner("Grading essay with Gemini..."):
-            prompt = build_gemini_prompt(essay, rubric, extra)
-            try:
-                result = get_gemini_response(prompt)
+        # The whole pipeline is timed, whichever path grades the essay
+        with span("grade_essay", words=len(essay.split())) as grade_record:
+            # One status box follows the real pipeline stages
+            started = time.perf_counter()
+            status = st.status("🧠 Checking for near-duplicate essays...")
+            # Near-duplicates are looked up among essays graded earlier against the same rubric
+            duplicate_index = get_duplicate_index()
+            namespace = assignment_key(rubric, extra, grading_mode)
+            essay_hash = content_hash(essay)[:12]
+            essay_id = f"{st.session_state.essay_name} ({essay_hash})" if st.session_state.essay_name else essay_hash
+            with span("duplicate_lookup") as record:
+                matches = duplicate_index.find(namespace, essay, exclude=essay_id)
+                record["matches"] = len(matches)
+            duplicate = matches[0] if matches else None
+            reused = bool(reuse_duplicates and duplicate and duplicate.result and duplicate.exact)
+            st.session_state.duplicate_match = {
+                "essay_id": duplicate.essay_id, "similarity": duplicate.similarity, "namespace": namespace, "reused": reused,
+                "essay_hash": essay_hash,
+            } if duplicate else None
+            previous_result = st.session_state.grading_result
+            service = get_service_client()
+            grade_record["path"] = "reused" if reused else "service" if service is not None else "long_essay" if is_long_essay(essay) else "stream"
+            if reused:
+                st.session_state.grading_result = duplicate.result
+            elif service is not None:
+                status.update(label="🧠 Submitting to the grading service...")
                 try:
-                    json_result = json.loads(result)
-                    grade = json_result.get("overall_grade", "N/A")
-                    feedback = json_result.get("detailed_specific_feedback", "No feedback available")
-                    st.session_state.grading_result = {"grade": grade, "feedback": feedback}
-                except json.JSONDecodeError:
-                    st.error("Error parsing AI response. Raw response:")
-                    st.text(result)
-            except Exception as e:
-                st.error(f"Error: {e}")
-        progress_placeholder.empty()
-        animation_placeholder.empty()
+                    job_id = service.submit_grade(
+                        essay, rubric, extra, user=current_user(), use_cache=not bypass_cache, mode=grading_mode,
+                    )
+                    st.session_state.grading_result = service.run(job_id, on_status=lambda job: show_job_status(status, job))
+                except ServiceError as e:
+                    if e.status == 429:
+                        st.error("The grading service is busy. Please try again in a few seconds.")
+                    else:
+                        st.error(f"Error: {e}")
+            elif is_long_essay(essay):
+                section_count = len(split_essay_sections(essay))
+                status.update(label=f"🧠 Long essay: grading {section_count} sections in parallel...")
+                section_progress = st.progress(0.0, text=f"0 / {section_count} sections graded")
+                finished_sections = queue.Queue()
+                try:
+                    # Sections finish on worker threads; the script thread reports them as they arrive
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        future = executor.submit(
+                            grade_long_essay, essay, rubric, extra, use_cache=not bypass_cache, mode=grading_mode,
+                            on_section=lambda section, result: finished_sections.put(section),
+                        )
+                        graded = 0
+                        while not future.done() or not finished_sections.empty():
+                            try:
+                                finished_sections.get(timeout=0.2)
+                            except queue.Empty:
+                                continue
+                            graded += 1
+                            section_progress.progress(graded / section_count, text=f"{graded} / {section_count} sections graded")
+                            if graded == section_count:
+                                status.update(label="🧠 Combining the section feedback...")
+                        result = future.result()
+                    try:
+                        st.session_state.grading_result = parse_grading_response(result)
+                    except ValueError:
+                        st.error("Error parsing AI response. Raw response:")
+                        st.text(result)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+                section_progress.empty()
+            else:
+                status.update(label="🧠 Building the prompt...")
+                prompt = build_gemini_prompt(essay, rubric, extra)
+                tier = select_tier(essay, rubric, grading_mode)
+                status.update(label=f"🧠 Waiting for Gemini ({tier.model})...")
+                # Render the grade and feedback incrementally while the response streams in
+                stream_grade_placeholder = st.empty()
+                stream_feedback_placeholder = st.empty()
+                parser = StreamingJsonParser()
+                parse_seconds = 0.0
+                try:
+                    for index, chunk in enumerate(stream_gemini_response(
+                        prompt, use_cache=not bypass_cache, model=tier.model, thinking_budget=tier.thinking_budget,
+                    )):
+                        if index == 0:
+                            status.update(label="🧠 Receiving feedback...")
+                        parse_started = time.perf_counter()
+                        values = parser.feed(chunk)
+                        parse_seconds += time.perf_counter() - parse_started
+                        if "overall_grade" in parser.completed:
+                            stream_grade_placeholder.markdown(f"### Overall Grade: {values['overall_grade']}")
+                        if values.get("detailed_specific_feedback"):
+                            stream_feedback_placeholder.markdown(values["detailed_specific_feedback"])
+                    if parser.done:
+                        grade = parser.values.get("overall_grade", "N/A")
+                        feedback = parser.values.get("detailed_specific_feedback", "No feedback available")
+                        st.session_state.grading_result = {"grade": grade, "feedback": feedback}
+                    else:
+                        st.error("Error parsing AI response. Raw response:")
+                        st.text(parser.text)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+                grade_record["json_parse_ms"] = round(parse_seconds * 1000, 3)
+                stream_grade_placeholder.empty()
+                stream_feedback_placeholder.empty()
+
+            if st.session_state.grading_result is previous_result:
+                grade_record["error"] = "GradingFailed"
+                status.update(label="🧠 Grading failed", state="error")
+            elif reused:
+                status.update(label="🧠 Reused the grade of an identical essay", state="complete")
+            else:
+                status.update(label=f"🧠 Graded in {time.perf_counter() - started:.1f}s", state="complete")
+            if st.session_state.grading_result is not previous_result:
+                duplicate_index.add(namespace, essay_id, essay, st.session_state.grading_result)
+                result = {"id": essay_id, "status": "ok", **st.session_state.grading_result}
+                if duplicate:
+                    result.update(duplicate_of=duplicate.essay_id, similarity=round(duplicate.similarity, 3), reused=reused)
+                append_result(APP_RESULTS_PATH, result)
+
+    match = st.session_state.duplicate_match
+    if match and essay and content_hash(essay)[:12] == match["essay_hash"]:
+        if match["reused"]:
+            st.info(f"♻️ This essay is {match['similarity']:.0%} similar to **{match['essay_id']}**, graded earlier with this rubric. Its grade was reused.")
+        else:
+            st.warning(f"⚠️ This essay is {match['similarity']:.0%} similar to **{match['essay_id']}**, graded earlier with this rubric.")
+        with st.expander("Show differences from the earlier essay", expanded=False):
+            previous_text = get_duplicate_index().get_text(match["namespace"], match["essay_id"])
+            difference = essay_diff(previous_text, essay) if previous_text else ""
+            if difference:
+                st.code(difference, language="diff")
+            else:
+                st.write("No differences in wording; only formatting or whitespace differ.")
 
     if st.session_state.grading_result:
         grade = st.session_state.grading_result["grade"]
@@ -291,10 +447,8 @@ def main():
 
 def settings_page():
     import getpass
-    from backend.file_utils import load_user_settings, save_user_settings
     st.title("User Settings ⚙️")
-    settings_path = os.path.join(os.path.dirname(__file__), '../user_settings.json')
-    settings = load_user_settings(settings_path)
+    settings = load_settings()
     
     name = st.text_input("Your Name", value=settings.get("name", ""))
     grading_scale = st.selectbox("Preferred Grading Scale", ["A-F", "1-10", "Percentage"], index=["A-F", "1-10", "Percentage"].index(settings.get("grading_scale", "A-F")))
@@ -308,37 +462,176 @@ def settings_page():
             "default_rubric": default_rubric,
             "theme": theme
         }
-        save_user_settings(new_settings, settings_path)
-        st.success("Settings saved! Please reload the app to see theme changes.")
-        apply_theme()
+        if save_settings(new_settings):
+            apply_theme(theme)
+            st.success("Settings saved! Please reload the app to see theme changes.")
+        else:
+            st.info("No changes to save.")
     st.info("Settings are stored locally in user_settings.json. Theme changes require a reload.")
 
+ISSUES_PAGE_SIZE = 50
+
+def render_issue_list(issues, color, start_number):
+    for i, issue in enumerate(issues, start_number):
+        st.markdown(f"**{i}.** <span style='color:{color}'><b>{issue['text']}</b></span> (at position {issue['offset']}): {issue['message']}<br>**Suggestions:** {', '.join(issue['suggestions']) if issue['suggestions'] else 'No suggestions'}", unsafe_allow_html=True)
+
 def grammar_spelling_database_page():
     st.title("Grammar & Spelling Database 🗂️")
-    issues = load_grammar_spelling_issues()
-    if not issues:
+    store = get_issue_store()
+    total = store.count_issues()
+    if not total:
         st.info("No grammar or spelling issues have been recorded yet.")
         return
-    grammar_issues = [i for i in issues if i['type'] == 'grammar']
-    spelling_issues = [i for i in issues if i['type'] == 'spelling']
-    st.header("Grammar Issues")
-    if grammar_issues:
-        for i, issue in enumerate(grammar_issues, 1):
-            st.markdown(f"**{i}.** <span style='color:#e67e22'><b>{issue['text']}</b></span> (at position {issue['offset']}): {issue['message']}<br>**Suggestions:** {', '.join(issue['suggestions']) if issue['suggestions'] else 'No suggestions'}", unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Recorded issues", total)
+    col2.metric("Essays checked", store.essay_count())
+    col3.metric("Spelling issues", store.count_issues(issue_type='spelling'))
+
+    st.header("Most Common Issues")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Rules**")
+        st.table([{"Rule": r['rule_id'], "Type": r['type'], "Count": r['count']} for r in store.most_common_rules()])
+    with col2:
+        st.markdown("**Misspellings**")
+        misspellings = store.most_common_misspellings()
+        if misspellings:
+            st.table([{"Word": m['text'], "Count": m['count'], "Essays": m['essays']} for m in misspellings])
+        else:
+            st.write("No spelling issues found.")
+
+    st.header("Browse Issues")
+    col1, col2 = st.columns(2)
+    with col1:
+        type_label = st.selectbox("Issue type", ["Grammar", "Spelling"], key="issue_type_filter")
+    issue_type = type_label.lower()
+    count = store.count_issues(issue_type=issue_type)
+    if not count:
+        st.write(f"No {issue_type} issues found.")
+        return
+    page_count = (count + ISSUES_PAGE_SIZE - 1) // ISSUES_PAGE_SIZE
+    with col2:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, key="issue_page")
+    offset = (page - 1) * ISSUES_PAGE_SIZE
+    issues = store.query_issues(issue_type=issue_type, limit=ISSUES_PAGE_SIZE, offset=offset)
+    st.caption(f"Showing {offset + 1}–{offset + len(issues)} of {count} {issue_type} issues, newest first.")
+    render_issue_list(issues, '#e67e22' if issue_type == 'grammar' else '#e74c3c', offset + 1)
+
+SPAN_LABELS = {
+    "grade_essay": "Grade essay (end to end)",
+    "extract": "File extraction",
+    "prompt_build": "Prompt build",
+    "response_cache_lookup": "Response cache lookup",
+    "duplicate_lookup": "Near-duplicate lookup",
+    "gemini_request": "Gemini request",
+    "json_parse": "JSON parse",
+    "grammar_check": "Grammar check (end to end)",
+    "languagetool_request": "LanguageTool request",
+}
+
+def performance_page():
+    st.title("Performance 📈")
+    records = load_records()
+    if not records:
+        st.info("No timings have been recorded yet. Grade an essay or run a grammar check first.")
+        return
+    summary = summarize(records)
+    st.caption(f"Based on the last {len(records)} recorded spans.")
+    st.header("Latency")
+    st.table([
+        {
+            "Stage": SPAN_LABELS.get(row["name"], row["name"]),
+            "Count": row["count"],
+            "Errors": row["errors"],
+            "p50 (ms)": row["p50_ms"],
+            "p95 (ms)": row["p95_ms"],
+            "Max (ms)": row["max_ms"],
+        }
+        for row in summary
+    ])
+    gemini_records = [r for r in records if r["name"] == "gemini_request"]
+    first_chunks = sorted(r["first_chunk_ms"] for r in gemini_records if "first_chunk_ms" in r)
+    if first_chunks:
+        st.metric("Time to first streamed chunk (p50)", f"{first_chunks[len(first_chunks) // 2]:.0f} ms")
+    cache_row = next((row for row in summary if row["name"] == "response_cache_lookup" and "hit_rate" in row), None)
+    if cache_row:
+        st.metric("Response cache hit rate", f"{cache_row['hit_rate']:.0%}", help=f"{cache_row['hits']} of {cache_row['count']} lookups")
+    st.header("Token Usage")
+    token_rows = [row for row in summary if "total_total_tokens" in row]
+    if token_rows:
+        st.table([
+            {
+                "Stage": SPAN_LABELS.get(row["name"], row["name"]),
+                "Prompt (p50)": row.get("p50_prompt_tokens"),
+                "Thinking (p50)": row.get("p50_thinking_tokens"),
+                "Output (p50)": row.get("p50_output_tokens"),
+                "Cached (p50)": row.get("p50_cached_tokens"),
+                "Total tokens": row.get("total_total_tokens"),
+            }
+            for row in token_rows
+        ])
     else:
-        st.write("No grammar issues found.")
-    st.header("Spelling Issues")
-    if spelling_issues:
-        for i, issue in enumerate(spelling_issues, 1):
-            st.markdown(f"**{i}.** <span style='color:#e74c3c'><b>{issue['text']}</b></span> (at position {issue['offset']}): {issue['message']}<br>**Suggestions:** {', '.join(issue['suggestions']) if issue['suggestions'] else 'No suggestions'}", unsafe_allow_html=True)
+        st.write("No token usage has been recorded yet.")
+    if st.button("Export Prometheus metrics"):
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.cache/metrics.prom'))
+        export_prometheus(path, records)
+        st.success(f"Metrics written to {path}")
+
+def export_page():
+    st.title("Bulk Export 📦")
+    st.write("Export grades and feedback for a whole class. Results are streamed to disk one essay at a time, so large runs export without loading them all into memory.")
+    source = st.radio("Results to export", ["Essays graded in this app", "Batch grader results file (JSONL)"], key="export_source")
+    if source == "Essays graded in this app":
+        if not os.path.exists(APP_RESULTS_PATH):
+            st.info("No essays have been graded in the app yet.")
+            return
+        results_file = None
     else:
-        st.write("No spelling issues found.")
+        results_file = st.file_uploader("Results JSONL written by the batch grader", type=["jsonl"], key="export_upload")
+        if results_file is None:
+            return
+    formats = st.multiselect("Formats", list(EXPORT_FORMATS), default=list(EXPORT_FORMATS), key="export_formats")
+    if st.button("Prepare export", type="primary", disabled=not formats):
+        if st.session_state.export_dir:
+            shutil.rmtree(st.session_state.export_dir, ignore_errors=True)
+        os.makedirs(EXPORT_ROOT, exist_ok=True)
+        export_dir = tempfile.mkdtemp(dir=EXPORT_ROOT)
+        paths = {label: os.path.join(export_dir, EXPORT_FORMATS[label][0]) for label in formats}
+        if results_file is None:
+            # Essays graded more than once are exported with their latest grade
+            compact_results(APP_RESULTS_PATH)
+            results = iter_results(APP_RESULTS_PATH)
+        else:
+            results = read_results(io.TextIOWrapper(results_file, encoding='utf-8'))
+        try:
+            count = export_results(
+                results,
+                csv_path=paths.get("CSV (one row per essay)"),
+                jsonl_path=paths.get("JSONL (feedback split into sections)"),
+                zip_path=paths.get("Zip of feedback files (one per student)"),
+            )
+        except (ValueError, KeyError) as e:
+            shutil.rmtree(export_dir, ignore_errors=True)
+            st.session_state.export_dir = None
+            st.error(f"Could not read the results file: {e}")
+            return
+        st.session_state.export_dir = export_dir
+        st.success(f"Exported {count} results.")
+    export_dir = st.session_state.export_dir
+    if export_dir and os.path.isdir(export_dir):
+        for label, (file_name, mime) in EXPORT_FORMATS.items():
+            path = os.path.join(export_dir, file_name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    st.download_button(f"📥 Download {label}", data=f, file_name=file_name, mime=mime, key=f"export_{file_name}")
 
 # Navigation
 PAGES = {
     "Essay Grader": main,
+    "Bulk Export": export_page,
     "User Settings": settings_page,
-    "Grammar & Spelling Database": grammar_spelling_database_page
+    "Grammar & Spelling Database": grammar_spelling_database_page,
+    "Performance": performance_page
 }
 
 def run():
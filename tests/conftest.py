@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import context_cache, metrics, response_cache
+from backend.fake_gemini_server import FakeGeminiServer
+from backend.gemini_client import reset_client
+
+@pytest.fixture(autouse=True)
+def isolated_caches(monkeypatch):
+    # Spans and cached responses from the code under test stay out of .cache/
+    monkeypatch.setattr(metrics, '_recorder', metrics.MetricsRecorder(path=None))
+    monkeypatch.setattr(response_cache, '_cache', response_cache.ResponseCache(':memory:'))
+
+@pytest.fixture
+def serve_gemini(monkeypatch):
+    # Starts a fake Gemini server (a FakeGeminiServer subclass can be passed to change its
+    # responses) and points the shared client at it
+    servers = []
+
+    def serve(server=None):
+        server = server or FakeGeminiServer()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv('GEMINI_BASE_URL', server.url)
+        monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+        reset_client()
+        context_cache.set_context_cache(None)
+        return server
+
+    yield serve
+    context_cache.set_context_cache(None)
+    reset_client()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def fake_server(serve_gemini):
+    return serve_gemini()
@@ -0,0 +1,54 @@
+import pytest
+
+from backend import batch_grader
+from backend.batch_grader import grade_batch
+from backend.fake_gemini_server import FakeGeminiServer
+from backend.gemini_api import parse_grading_response
+
+class NoTextServer(FakeGeminiServer):
+    # Answers like a safety block: a candidate with no parts
+    def build_response(self, body):
+        response = super().build_response(body)
+        response["candidates"][0]["content"]["parts"] = []
+        response["candidates"][0]["finishReason"] = "SAFETY"
+        return response
+
+def write_essays(tmp_path, count):
+    essays = []
+    for n in range(count):
+        path = tmp_path / f"student_{n}.txt"
+        path.write_text(f"Essay number {n}. Homework should be optional because students learn best when rested.")
+        essays.append((f"student_{n}", str(path)))
+    return essays
+
+@pytest.mark.parametrize("text", [None, "", "[1, 2]", '"B+"', "{not json"])
+def test_parse_grading_response_rejects_anything_but_an_object(text):
+    with pytest.raises(ValueError):
+        parse_grading_response(text)
+
+def test_empty_model_response_fails_only_that_essay(serve_gemini, tmp_path):
+    serve_gemini(NoTextServer())
+    results = grade_batch(write_essays(tmp_path, 2), "Grade on thesis.", concurrency=2, use_cache=False)
+
+    assert [result["status"] for result in results] == ["error", "error"]
+
+def test_non_object_json_fails_only_that_essay(serve_gemini, tmp_path):
+    serve_gemini(FakeGeminiServer(response=["B+", "Good"]))
+    results = grade_batch(write_essays(tmp_path, 2), "Grade on thesis.", concurrency=2, use_cache=False)
+
+    assert [result["status"] for result in results] == ["error", "error"]
+
+def test_unexpected_error_in_one_essay_does_not_abort_the_batch(fake_server, tmp_path, monkeypatch):
+    grade_one = batch_grader.grade_one
+
+    def flaky_grade_one(essay_id, *args):
+        if essay_id == "student_1":
+            raise RuntimeError("boom")
+        return grade_one(essay_id, *args)
+
+    monkeypatch.setattr(batch_grader, "grade_one", flaky_grade_one)
+    results = grade_batch(write_essays(tmp_path, 3), "Grade on thesis.", concurrency=2, use_cache=False)
+
+    by_id = {result["id"]: result for result in results}
+    assert by_id["student_1"] == {"id": "student_1", "path": str(tmp_path / "student_1.txt"), "status": "error", "error": "boom"}
+    assert by_id["student_0"]["status"] == by_id["student_2"]["status"] == "ok"
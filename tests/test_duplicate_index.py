@@ -0,0 +1,101 @@
+import random
+
+from backend.batch_grader import grade_batch
+from backend.duplicate_index import DuplicateIndex, assignment_key
+
+WORDS = "homework students learn rest school teachers evidence argue optional policy time family sleep grades".split()
+
+def make_essay(seed, words=400):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+def substitute_words(text, count):
+    words = text.split()
+    for position in range(0, count * 50, 50):
+        words[position] = "zebra"
+    return " ".join(words)
+
+def test_reformatted_copy_is_an_exact_match():
+    index = DuplicateIndex(':memory:')
+    namespace = assignment_key("Rubric")
+    essay = make_essay(1)
+    index.add(namespace, "/class-a/essay1.txt", essay, {"grade": "B", "feedback": "ok"})
+
+    match, = index.find(namespace, essay.upper().replace(" ", "\n  "))
+    assert (match.essay_id, match.similarity, match.exact) == ("/class-a/essay1.txt", 1.0, True)
+    assert match.result == {"grade": "B", "feedback": "ok"}
+
+def test_a_few_substituted_words_are_flagged_but_not_exact():
+    index = DuplicateIndex(':memory:')
+    namespace = assignment_key("Rubric")
+    essay = make_essay(2)
+    index.add(namespace, "a", essay, {"grade": "B", "feedback": "ok"})
+
+    match, = index.find(namespace, substitute_words(essay, 3))
+    assert 0.8 <= match.similarity < 1.0
+    assert not match.exact
+
+def test_only_the_best_match_carries_its_result():
+    index = DuplicateIndex(':memory:')
+    namespace = assignment_key("Rubric")
+    essay = make_essay(3)
+    index.add(namespace, "copy", essay, {"grade": "A", "feedback": "copy"})
+    index.add(namespace, "near", substitute_words(essay, 2), {"grade": "C", "feedback": "near"})
+
+    best, other = index.find(namespace, essay)
+    assert (best.essay_id, best.result["grade"]) == ("copy", "A")
+    assert (other.essay_id, other.result) == ("near", None)
+
+def test_namespaces_separate_rubrics_instructions_and_modes():
+    keys = {
+        assignment_key("Rubric", "", "thorough"),
+        assignment_key("Rubric", "", "fast"),
+        assignment_key("Rubric", "Be strict", "thorough"),
+        assignment_key("Other rubric", "", "thorough"),
+    }
+    assert len(keys) == 4
+    assert assignment_key("Rubric", "", None) == assignment_key("Rubric", "", "thorough")
+
+def test_old_entries_are_pruned(tmp_path):
+    path = str(tmp_path / "index.sqlite3")
+    index = DuplicateIndex(path, retention_days=30)
+    namespace = assignment_key("Rubric")
+    index.add(namespace, "old", make_essay(4))
+    index.conn.execute("UPDATE essays SET indexed_at = 0")
+    index.conn.commit()
+    index.conn.close()
+
+    reopened = DuplicateIndex(path, retention_days=30)
+    assert reopened.find(namespace, make_essay(4)) == []
+    assert reopened.stats()["essays"] == 0
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+def test_batch_reuses_grades_only_for_identical_essays_in_the_same_mode(fake_server, tmp_path):
+    index = DuplicateIndex(':memory:')
+    essay = make_essay(5)
+    first = [("original", write(tmp_path, "class-a/essay1.txt", essay))]
+    grade_batch(first, "Rubric", use_cache=False, duplicate_index=index, reuse_duplicates=True, mode="thorough")
+    requests_after_first = len(fake_server.requests)
+
+    second = [
+        ("copy", write(tmp_path, "class-b/essay1.txt", "  " + essay.upper())),
+        ("edited", write(tmp_path, "class-b/essay2.txt", substitute_words(essay, 3))),
+    ]
+    results = {r["id"]: r for r in grade_batch(second, "Rubric", use_cache=False, concurrency=1,
+                                                  duplicate_index=index, reuse_duplicates=True, mode="thorough")}
+    assert results["copy"]["reused"] is True
+    assert results["copy"]["duplicate_of"] == first[0][1]
+    assert "reused" not in results["edited"]
+    assert results["edited"]["duplicate_of"] in (first[0][1], second[0][1])
+    assert len(fake_server.requests) == requests_after_first + 1
+
+    fast, = grade_batch([("fast", write(tmp_path, "class-c/essay1.txt", essay))], "Rubric", use_cache=False,
+                        duplicate_index=index, reuse_duplicates=True, mode="fast")
+    assert "duplicate_of" not in fast
+    # Same-named files from different classes are separate entries
+    assert index.stats()["essays"] == 4
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.fake_gemini_server import FakeGeminiHandler, FakeGeminiServer
+from backend.gemini_api import get_gemini_response, get_generate_content_config
+from backend.gemini_client import build_http_options, get_client
+
+class ConnectionTrackingHandler(FakeGeminiHandler):
+    def do_POST(self):
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+        super().do_POST()
+
+class ConnectionTrackingServer(FakeGeminiServer):
+    def __init__(self):
+        super().__init__(handler=ConnectionTrackingHandler)
+        self.connections = set()
+
+def test_client_is_shared_across_threads(fake_server):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(lambda _: get_client(), range(32)))
+
+    assert all(client is clients[0] for client in clients)
+
+def test_sequential_requests_reuse_one_connection(serve_gemini):
+    server = serve_gemini(ConnectionTrackingServer())
+    for n in range(5):
+        assert get_gemini_response(f"Essay {n}", use_cache=False)
+
+    assert len(server.requests) == 5
+    assert len(server.connections) == 1
+
+def test_generate_content_config_is_built_once():
+    assert get_generate_content_config(0) is get_generate_content_config(0)
+    assert get_generate_content_config(0) is not get_generate_content_config(1024)
+
+def test_http_options_from_environment(monkeypatch):
+    monkeypatch.setenv('GEMINI_POOL_SIZE', '3')
+    monkeypatch.setenv('GEMINI_TIMEOUT', '2.5')
+    monkeypatch.setenv('GEMINI_BASE_URL', 'http://127.0.0.1:9/')
+    options = build_http_options()
+
+    assert options.base_url == 'http://127.0.0.1:9/'
+    assert options.timeout == 2500
+    assert options.client_args['limits'].max_connections == 3
+    assert options.async_client_args['limits'].max_keepalive_connections == 3
@@ -0,0 +1,90 @@
+import json
+
+from backend import batch_grader
+from backend.batch_grader import grade_batch, written_ids
+from backend.grading_journal import GradingJournal
+from test_batch_grader import NoTextServer, write_essays
+
+def test_replay_restores_state_and_skips_a_torn_line(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    journal = GradingJournal(path)
+    for key in ("done", "running", "broken", "retried"):
+        journal.submitted(key, key)
+    journal.complete("done", "done", {"status": "ok", "grade": "A"})
+    journal.fail("broken", "broken", "timeout")
+    journal.fail("retried", "retried", "timeout")
+    journal.complete("retried", "retried", {"status": "ok", "grade": "B"})
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"event": "completed", "key": "running", "res')
+
+    replayed = GradingJournal(path)
+    assert replayed.result_for("done") == {"status": "ok", "grade": "A"}
+    assert replayed.result_for("retried") == {"status": "ok", "grade": "B"}
+    assert replayed.result_for("running") is None
+    assert replayed.recovered == {"running", "broken"}
+    assert replayed.stats() == {"completed": 2, "failed": 1, "in_flight": 1}
+    replayed.complete("running", "running", {"status": "ok", "grade": "C"})
+    replayed.close()
+
+    # The record written after the torn line is on a line of its own
+    assert GradingJournal(path).result_for("running") == {"status": "ok", "grade": "C"}
+
+def test_written_ids_counts_ok_results_and_skips_a_torn_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n{"id": "c", "sta')
+    assert written_ids(str(path)) == {"a"}
+    assert written_ids(str(tmp_path / "missing.jsonl")) == set()
+
+def test_essays_are_journaled_completed_only_after_on_result(fake_server, tmp_path):
+    journal = GradingJournal(str(tmp_path / "run.journal.jsonl"))
+    completed_when_written = []
+
+    def on_result(result):
+        completed_when_written.append(journal.stats()["completed"])
+
+    grade_batch(write_essays(tmp_path, 3), "Rubric", concurrency=1, use_cache=False, on_result=on_result, journal=journal)
+    assert completed_when_written == [0, 1, 2]
+    assert journal.stats() == {"completed": 3, "failed": 0, "in_flight": 0}
+    journal.close()
+
+def test_failed_essays_are_graded_again_on_resume(serve_gemini, tmp_path):
+    essays = write_essays(tmp_path, 2)
+    path = str(tmp_path / "run.journal.jsonl")
+    serve_gemini(NoTextServer())
+    journal = GradingJournal(path)
+    assert {r["status"] for r in grade_batch(essays, "Rubric", use_cache=False, journal=journal)} == {"error"}
+    journal.close()
+
+    serve_gemini()
+    journal = GradingJournal(path)
+    assert len(journal.recovered) == 2
+    results = grade_batch(essays, "Rubric", use_cache=False, journal=journal)
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    assert not any(r.get("resumed") for r in results)
+    journal.close()
+
+def run_main(tmp_path, *extra):
+    rubric = tmp_path / "rubric.txt"
+    rubric.write_text("Grade on thesis.")
+    return batch_grader.main([
+        str(tmp_path / "essays"), str(rubric), "--output", str(tmp_path / "results.jsonl"),
+        "--no-duplicate-check", "--no-cache", *extra,
+    ])
+
+def test_resumed_run_writes_each_result_once(fake_server, tmp_path):
+    (tmp_path / "essays").mkdir()
+    write_essays(tmp_path / "essays", 3)
+    assert run_main(tmp_path) == 0
+    graded = len(fake_server.requests)
+    output = tmp_path / "results.jsonl"
+    # The previous run journaled all three, then stopped mid-way through writing the last one
+    lines = output.read_text().splitlines()
+    output.write_text("\n".join(lines[:2]) + "\n" + lines[2][:20])
+
+    assert run_main(tmp_path) == 0
+    assert len(fake_server.requests) == graded
+    first, second, torn, rewritten = output.read_text().splitlines()
+    assert (first, second, torn) == (lines[0], lines[1], lines[2][:20])
+    assert json.loads(rewritten) == json.loads(lines[2])
+    assert written_ids(str(output)) == {"student_0", "student_1", "student_2"}
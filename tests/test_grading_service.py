@@ -0,0 +1,114 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from backend.grading_service import (
+    MAX_BODY_BYTES, FairJobQueue, GradingServer, Job, JobManager, QueueFull,
+)
+
+def test_queue_serves_users_round_robin():
+    queue = FairJobQueue()
+    for user, count in (("alice", 3), ("bob", 2), ("carol", 1)):
+        for n in range(count):
+            queue.put(Job('grade', user, {"n": n}))
+
+    order = [(job.user, job.payload["n"]) for job in iter(lambda: queue.get(timeout=0), None)]
+    assert order == [("alice", 0), ("bob", 0), ("carol", 0), ("alice", 1), ("bob", 1), ("alice", 2)]
+
+def test_queue_limits_are_enforced():
+    queue = FairJobQueue(max_queued=3, max_queued_per_user=2)
+    queue.put(Job('grade', "alice", {}))
+    queue.put(Job('grade', "alice", {}))
+    with pytest.raises(QueueFull):
+        queue.put(Job('grade', "alice", {}))
+    queue.put(Job('grade', "bob", {}))
+    with pytest.raises(QueueFull):
+        queue.put(Job('grade', "carol", {}))
+    assert len(queue) == 3
+
+@pytest.fixture
+def service():
+    release = threading.Event()
+
+    def runner(kind, payload):
+        release.wait(5)
+        return {"grade": "B+", "essay": payload["essay"]}
+
+    manager = JobManager(workers=1, runner=runner, max_queued=2)
+    server = GradingServer(('127.0.0.1', 0), manager, token="secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, release
+    release.set()
+    manager.shutdown()
+    server.shutdown()
+    server.server_close()
+
+def request(server, method, path, body=None, token="secret", headers=None):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    headers = dict(headers or {})
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if body is not None and not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    payload = json.loads(response.read() or b'null')
+    connection.close()
+    return response.status, payload
+
+def test_job_lifecycle_and_wait(service):
+    server, release = service
+    status, job = request(server, 'POST', '/jobs', {"type": "grade", "essay": "Essay", "rubric": "Rubric", "user": "alice"})
+    assert status == 202
+
+    status, waited = request(server, 'GET', f"/jobs/{job['id']}/wait?timeout=0.2&status=queued")
+    assert status == 200 and waited["status"] == "running"
+    release.set()
+    status, waited = request(server, 'GET', f"/jobs/{job['id']}/wait?timeout=5&status=running")
+    assert waited["status"] == "done"
+    assert waited["result"] == {"grade": "B+", "essay": "Essay"}
+
+@pytest.mark.parametrize("timeout", ["abc", "-1", "nan", "inf"])
+def test_wait_rejects_malformed_timeouts(service, timeout):
+    server, _ = service
+    _, job = request(server, 'POST', '/jobs', {"essay": "Essay", "rubric": "Rubric"})
+
+    status, payload = request(server, 'GET', f"/jobs/{job['id']}/wait?timeout={timeout}")
+    assert status == 400
+
+def test_unknown_job_and_invalid_submissions(service):
+    server, _ = service
+    assert request(server, 'GET', '/jobs/missing/wait?timeout=0')[0] == 404
+    assert request(server, 'POST', '/jobs', {"essay": "Essay"})[0] == 400
+    assert request(server, 'POST', '/jobs', {"type": "poem", "essay": "Essay"})[0] == 400
+    assert request(server, 'POST', '/jobs', ["not", "an", "object"])[0] == 400
+    assert request(server, 'POST', '/jobs', b'{broken')[0] == 400
+
+def test_full_queue_answers_429(service):
+    server, _ = service
+    _, running = request(server, 'POST', '/jobs', {"essay": "Essay", "rubric": "Rubric"})
+    assert request(server, 'GET', f"/jobs/{running['id']}/wait?timeout=5&status=queued")[1]["status"] == "running"
+    # The worker is busy, so two more jobs fill the queue
+    statuses = [request(server, 'POST', '/jobs', {"essay": f"Essay {n}", "rubric": "Rubric"})[0] for n in range(3)]
+    assert statuses == [202, 202, 429]
+
+@pytest.mark.parametrize("length, expected", [("-1", 400), ("abc", 400), (str(MAX_BODY_BYTES + 1), 413)])
+def test_content_length_is_validated_before_reading(service, length, expected):
+    server, _ = service
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+    connection.putrequest('POST', '/jobs')
+    connection.putheader('Authorization', 'Bearer secret')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    response = connection.getresponse()
+
+    assert response.status == expected
+    connection.close()
+
+def test_token_is_required_except_for_health(service):
+    server, _ = service
+    assert request(server, 'GET', '/health', token=None)[0] == 200
+    assert request(server, 'GET', '/jobs/any', token=None)[0] == 401
+    assert request(server, 'GET', '/jobs/any', token="wrong")[0] == 401
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from backend.grammar_checker import GrammarChecker, RepeatedWordBackend, split_into_chunks
+
+def make_essay(rng, paragraphs=12):
+    words = ["the", "essay", "argues", "that", "homework", "should", "be", "optional", "because", "students", "rest"]
+    text = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(3, 40)))
+            sentences.append(sentence.capitalize() + rng.choice([".", "!", "?"]))
+        text.append((" " * rng.randint(1, 2)).join(sentences))
+    return "\n\n".join(text) + "\n"
+
+@pytest.mark.parametrize("max_chars", [40, 100, 300, 1500])
+def test_chunks_tile_the_text_within_the_limit(max_chars):
+    rng = random.Random(max_chars)
+    for _ in range(20):
+        text = make_essay(rng)
+        chunks = split_into_chunks(text, max_chars)
+
+        assert "".join(chunk for _, chunk in chunks) == text
+        assert all(text[offset:offset + len(chunk)] == chunk for offset, chunk in chunks)
+        assert all(0 < len(chunk) <= max_chars for _, chunk in chunks)
+
+def test_chunks_prefer_paragraph_then_sentence_boundaries():
+    first = "First paragraph. It is short."
+    second = "A long sentence that goes on. " * 5
+    text = f"{first}\n\n{second}"
+    chunks = [chunk for _, chunk in split_into_chunks(text, 60)]
+
+    assert chunks[0] == first + "\n\n"
+    assert all(chunk.endswith(". ") or chunk == chunks[-1] for chunk in chunks[1:])
+
+def test_a_word_longer_than_the_limit_is_hard_split():
+    text = "x" * 250
+    chunks = split_into_chunks(text, 100)
+
+    assert [(offset, len(chunk)) for offset, chunk in chunks] == [(0, 100), (100, 100), (200, 50)]
+
+def test_issue_offsets_point_into_the_original_text():
+    rng = random.Random(1)
+    text = make_essay(rng, paragraphs=30)
+    checker = GrammarChecker(RepeatedWordBackend(), max_workers=4, max_chunk_chars=200)
+    try:
+        issues = checker.check(text)
+    finally:
+        checker.close()
+
+    whole = RepeatedWordBackend().check(text)
+    # Repeats that straddle a chunk boundary cannot be seen by a chunked check
+    assert 0 < len(issues) <= len(whole)
+    for issue in issues:
+        assert text[issue["offset"]:issue["offset"] + issue["length"]] == issue["text"]
+        first, second = issue["text"].split()
+        assert first.lower() == second.lower()
+    assert [issue["offset"] for issue in issues] == sorted(issue["offset"] for issue in issues)
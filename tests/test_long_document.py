@@ -0,0 +1,91 @@
+import json
+import threading
+
+from backend.long_document import grade_long_essay, is_long_essay, split_essay_sections
+
+def paragraph(n, words=100):
+    return " ".join(f"word{n}" for _ in range(words)) + "."
+
+def test_plain_essay_splits_into_introduction_body_and_conclusion():
+    essay = "\n\n".join(paragraph(n) for n in range(6))
+    sections = split_essay_sections(essay, max_section_words=250)
+
+    assert [s["role"] for s in sections] == ["introduction", "body", "body", "conclusion"]
+    assert sections[0]["text"] == paragraph(0)
+    assert sections[-1]["text"] == paragraph(5)
+    assert [s["index"] for s in sections] == [1, 2, 3, 4]
+
+def test_every_paragraph_is_kept_once_in_order():
+    paragraphs = [paragraph(n, words=50 + 37 * n) for n in range(20)]
+    sections = split_essay_sections("\n\n".join(paragraphs), max_section_words=300)
+
+    assert "\n\n".join(s["text"] for s in sections).split("\n\n") == paragraphs
+
+def test_body_sections_respect_the_word_limit_unless_one_paragraph_is_longer():
+    paragraphs = [paragraph(0), paragraph(1, words=120), paragraph(2, words=900), paragraph(3, words=120), paragraph(4)]
+    sections = split_essay_sections("\n\n".join(paragraphs), max_section_words=300)
+
+    body = [s for s in sections if s["role"] == "body"]
+    assert [len(s["text"].split()) for s in body] == [120, 900, 120]
+
+def test_headings_set_roles_and_titles():
+    essay = "\n\n".join([
+        "Introduction", paragraph(0),
+        "1. Background", paragraph(1), paragraph(2),
+        "2. Analysis", paragraph(3),
+        "Conclusion", paragraph(4),
+    ])
+    sections = split_essay_sections(essay, max_section_words=150)
+
+    assert [(s["role"], s["title"]) for s in sections] == [
+        ("introduction", "Introduction"),
+        ("body", "1. Background"),
+        ("body", "1. Background (continued)"),
+        ("body", "2. Analysis"),
+        ("conclusion", "Conclusion"),
+    ]
+
+def test_single_line_breaks_are_used_when_there_are_no_blank_lines():
+    essay = "\n".join(paragraph(n) for n in range(4))
+
+    assert [s["role"] for s in split_essay_sections(essay)] == ["introduction", "body", "conclusion"]
+
+def test_short_and_empty_input():
+    assert split_essay_sections("") == []
+    assert [s["role"] for s in split_essay_sections(paragraph(0))] == ["body"]
+    assert not is_long_essay(paragraph(0, words=3999))
+    assert is_long_essay(paragraph(0, words=4000))
+
+def test_sections_are_graded_then_merged():
+    essay = "\n\n".join(paragraph(n, words=800) for n in range(6))
+    prompts = []
+    lock = threading.Lock()
+
+    def generate(prompt, use_cache, model, thinking_budget):
+        with lock:
+            prompts.append(prompt)
+        return json.dumps({"overall_grade": "B", "detailed_specific_feedback": f"feedback {len(prompts)}"})
+
+    finished = []
+    result = grade_long_essay(essay, "Rubric", "", generate=generate, on_section=lambda s, r: finished.append(s["index"]))
+
+    sections = split_essay_sections(essay)
+    assert sorted(finished) == [s["index"] for s in sections]
+    assert len(prompts) == len(sections) + 1
+    # The merge request comes last and sees every section's assessment
+    assert all(f"feedback {n}" in prompts[-1] for n in range(1, len(sections) + 1))
+    assert json.loads(result)["overall_grade"] == "B"
+
+def test_sections_without_a_json_object_are_merged_as_text():
+    essay = "\n\n".join(paragraph(n, words=800) for n in range(6))
+    section_count = len(split_essay_sections(essay))
+    # Sections are graded one at a time here, so the merge request is the last call
+    replies = iter([None, "[1, 2]", "plain words"] + ["{}"] * (section_count - 3)
+                   + ['{"overall_grade": "C", "detailed_specific_feedback": "merged"}'])
+
+    def generate(prompt, use_cache, model, thinking_budget):
+        return next(replies)
+
+    result = grade_long_essay(essay, "Rubric", "", generate=generate, max_workers=1)
+
+    assert json.loads(result)["overall_grade"] == "C"
@@ -0,0 +1,71 @@
+import pytest
+
+from backend import metrics
+from backend.context_cache import GeminiContextCache
+from backend.fake_gemini_server import FakeGeminiServer
+from backend.gemini_api import get_gemini_response, stream_gemini_response
+
+LONG_RUBRIC = "Thesis: clear and arguable. Evidence: specific and cited. Organization: logical. " * 80
+
+class TruncatedServer(FakeGeminiServer):
+    # Thinking used the whole budget: the JSON is cut off and the finish reason says so
+    def build_response(self, body):
+        response = super().build_response(body)
+        candidate = response["candidates"][0]
+        candidate["content"]["parts"][0]["text"] = candidate["content"]["parts"][0]["text"][:40]
+        candidate["finishReason"] = "MAX_TOKENS"
+        return response
+
+class NotJsonServer(FakeGeminiServer):
+    def response_text(self, body):
+        return "Overall grade: B+"
+
+def generate_requests(server):
+    return [r for r in server.requests if 'enerateContent' in r["path"]]
+
+def test_complete_response_is_served_from_cache(fake_server):
+    first = get_gemini_response("Essay", use_cache=True)
+    second = get_gemini_response("Essay", use_cache=True)
+
+    assert first == second
+    assert len(generate_requests(fake_server)) == 1
+
+@pytest.mark.parametrize("server_class", [TruncatedServer, NotJsonServer])
+def test_incomplete_or_unparseable_response_is_not_cached(serve_gemini, server_class):
+    server = serve_gemini(server_class())
+    get_gemini_response("Essay", use_cache=True)
+    get_gemini_response("Essay", use_cache=True)
+
+    assert len(generate_requests(server)) == 2
+
+def test_streamed_response_is_cached_once_complete(fake_server):
+    streamed = ''.join(stream_gemini_response("Essay", use_cache=True))
+    replayed = list(stream_gemini_response("Essay", use_cache=True))
+
+    assert replayed == [streamed]
+    assert len(generate_requests(fake_server)) == 1
+
+def test_truncated_stream_is_not_cached(serve_gemini):
+    server = serve_gemini(TruncatedServer())
+    for _ in range(2):
+        ''.join(stream_gemini_response("Essay", use_cache=True))
+
+    assert len(generate_requests(server)) == 2
+
+def test_context_cache_requests_use_the_response_cache(fake_server):
+    cache = GeminiContextCache()
+    cache.generate(LONG_RUBRIC, "Essay", use_cache=True)
+    cache.generate(LONG_RUBRIC, "Essay", use_cache=True)
+    cache.close()
+
+    assert len(generate_requests(fake_server)) == 1
+    lookups = [r for r in metrics.get_recorder().recent if r["name"] == "response_cache_lookup"]
+    assert [r["hit"] for r in lookups] == [False, True]
+
+def test_hit_rate_is_summarized_and_exported(fake_server):
+    for _ in range(4):
+        get_gemini_response("Essay", use_cache=True)
+
+    row, = [row for row in metrics.summarize(metrics.get_recorder().recent) if row["name"] == "response_cache_lookup"]
+    assert (row["hits"], row["hit_rate"]) == (3, 0.75)
+    assert 'essay_grader_recent_cache_hit_ratio{span="response_cache_lookup"} 0.75' in metrics.to_prometheus([row])
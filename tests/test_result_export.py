@@ -0,0 +1,91 @@
+import json
+import time
+import zipfile
+
+import pytest
+
+from backend import result_export
+from backend.result_export import (
+    ZipFeedbackExporter, append_result, compact_results, export_results, feedback_markdown, iter_results,
+)
+
+FEEDBACK = "**INTRODUCTION ANALYSIS**\nClear thesis.\n\n**AREAS FOR IMPROVEMENT**\nCite sources."
+
+def ok(essay_id, grade="B"):
+    return {"id": essay_id, "status": "ok", "grade": grade, "feedback": FEEDBACK}
+
+def write_zip(path, results):
+    exporter = ZipFeedbackExporter(str(path))
+    for result in results:
+        exporter.write(result)
+    exporter.close()
+    return zipfile.ZipFile(str(path))
+
+def test_zip_round_trips_feedback_and_skips_failed_essays(tmp_path):
+    results = [ok("alice"), {"id": "bob", "status": "error", "error": "timeout"}, ok("carol", "A")]
+    with write_zip(tmp_path / "feedback.zip", results) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["alice.md", "carol.md"]
+        assert archive.read("carol.md").decode('utf-8') == feedback_markdown(results[2])
+        assert all(info.compress_type == zipfile.ZIP_DEFLATED for info in archive.infolist())
+
+def test_repeated_and_colliding_ids_get_unique_names(tmp_path):
+    results = [ok("essay"), ok("essay"), ok("essay_2"), ok("essay"), ok("../../etc/passwd"), ok("...")]
+    with write_zip(tmp_path / "feedback.zip", results) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["essay.md", "essay_2.md", "essay_2_2.md", "essay_3.md", "etc_passwd.md", "essay_4.md"]
+        assert archive.read("essay_2_2.md").decode('utf-8') == feedback_markdown(results[2])
+
+def test_non_ascii_names_are_stored_as_utf8(tmp_path):
+    results = [ok("Zoë Müller"), ok("学生")]
+    with write_zip(tmp_path / "feedback.zip", results) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["Zoë_Müller.md", "学生.md"]
+        assert all(info.flag_bits & 0x800 for info in archive.infolist())
+        assert archive.read("学生.md").decode('utf-8') == feedback_markdown(results[1])
+
+def test_zip64_records_are_written_past_the_limits(tmp_path, monkeypatch):
+    # The real limits need 65535 entries or 4 GiB of output
+    monkeypatch.setattr(result_export, 'ZIP_FILECOUNT_LIMIT', 3)
+    monkeypatch.setattr(result_export, 'ZIP64_LIMIT', 300)
+    results = [ok(f"student_{n}", grade=str(n)) for n in range(6)]
+    path = tmp_path / "feedback.zip"
+    with write_zip(path, results) as archive:
+        assert archive.testzip() is None
+        assert archive.infolist()[-1].header_offset >= 300
+        for n, result in enumerate(results):
+            assert archive.read(f"student_{n}.md").decode('utf-8') == feedback_markdown(result)
+    data = path.read_bytes()
+    assert (result_export.ZIP64_END_RECORD).to_bytes(4, 'little') in data
+    assert (result_export.ZIP64_END_LOCATOR).to_bytes(4, 'little') in data
+
+def test_export_results_writes_every_format(tmp_path):
+    results = tmp_path / "results.jsonl"
+    results.write_text("\n".join(json.dumps(r) for r in [ok("alice"), {"id": "bob", "status": "error", "error": "x"}]) + "\n")
+    count = export_results(iter_results(str(results)), str(tmp_path / "out.csv"), str(tmp_path / "out.jsonl"), str(tmp_path / "out.zip"))
+
+    assert count == 2
+    rows = (tmp_path / "out.csv").read_text(encoding='utf-8')
+    assert "introduction_analysis" in rows.splitlines()[0] and "Clear thesis." in rows
+    sections = [json.loads(line)["sections"] for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert [s["title"] for s in sections[0]] == ["INTRODUCTION ANALYSIS", "AREAS FOR IMPROVEMENT"]
+    assert zipfile.ZipFile(str(tmp_path / "out.zip")).namelist() == ["alice.md"]
+
+def test_compaction_keeps_the_latest_result_per_essay(tmp_path):
+    path = str(tmp_path / "log" / "app_results.jsonl")
+    for grade in ("C", "B"):
+        append_result(path, ok("alice", grade))
+    append_result(path, ok("bob"))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"id": "carol", "gra')
+    assert compact_results(path) == 2
+    assert [(r["id"], r["grade"]) for r in iter_results(path)] == [("alice", "B"), ("bob", "B")]
+
+@pytest.mark.parametrize("appended, compacted", [(3, False), (4, True)])
+def test_log_is_compacted_once_it_doubles(tmp_path, monkeypatch, appended, compacted):
+    path = str(tmp_path / "app_results.jsonl")
+    line_bytes = len(json.dumps({**ok("alice"), "graded_at": time.time()})) + 1
+    monkeypatch.setattr(result_export, 'APP_LOG_MIN_COMPACT_BYTES', 4 * line_bytes - 1)
+    for _ in range(appended):
+        append_result(path, ok("alice"))
+    assert len(list(iter_results(path))) == (1 if compacted else appended)
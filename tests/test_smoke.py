@@ -0,0 +1,82 @@
+from backend.batch_grader import grade_batch
+from backend.context_cache import GeminiContextCache, LocalPrefixCache, set_context_cache
+from backend.fake_gemini_server import DEFAULT_RESPONSE
+
+# Long enough to be cached explicitly (MIN_CACHE_TOKENS at 4 characters per token)
+LONG_RUBRIC = "Thesis: clear and arguable. Evidence: specific and cited. Organization: logical. " * 80
+
+def generate_requests(server):
+    return [r for r in server.requests if ':generateContent' in r["path"]]
+
+def cache_creates(server):
+    return [r for r in server.requests if r["path"].split('?')[0].endswith('/cachedContents')]
+
+def test_grade_batch_against_fake_server(fake_server, tmp_path):
+    essays = []
+    for n in range(3):
+        path = tmp_path / f"student_{n}.txt"
+        path.write_text(f"Essay number {n}. Homework should be optional because students learn best when rested.")
+        essays.append((f"student_{n}", str(path)))
+    essays.append(("missing", str(tmp_path / "missing.txt")))
+
+    results = grade_batch(essays, "Grade on thesis and evidence.", concurrency=2, use_cache=False)
+
+    by_id = {result["id"]: result for result in results}
+    assert len(by_id) == 4
+    for n in range(3):
+        assert by_id[f"student_{n}"]["status"] == "ok"
+        assert by_id[f"student_{n}"]["grade"] == DEFAULT_RESPONSE["overall_grade"]
+        assert "Clear thesis." in by_id[f"student_{n}"]["feedback"]
+    assert by_id["missing"]["status"] == "error"
+    assert len(generate_requests(fake_server)) == 3
+
+def test_context_cache_is_created_once_and_reused(fake_server):
+    cache = GeminiContextCache()
+    for n in range(3):
+        cache.generate(LONG_RUBRIC, f"Essay {n}", use_cache=False)
+
+    assert (cache.created, cache.reused) == (1, 2)
+    assert len(cache_creates(fake_server)) == 1
+    name, = fake_server.cached_contents
+    requests = generate_requests(fake_server)
+    assert len(requests) == 3
+    assert all(r["body"].get("cachedContent") == name for r in requests)
+    # The prefix is sent once, in the cache, not with every essay
+    assert all("Thesis: clear" not in str(r["body"].get("contents")) for r in requests)
+
+    cache.close()
+    assert fake_server.cached_contents == {}
+
+def test_grade_batch_shares_one_context_cache(fake_server, tmp_path):
+    cache = GeminiContextCache()
+    set_context_cache(cache)
+    essays = []
+    for n in range(4):
+        path = tmp_path / f"student_{n}.txt"
+        path.write_text(f"Essay number {n} about school uniforms.")
+        essays.append((f"student_{n}", str(path)))
+
+    results = grade_batch(essays, LONG_RUBRIC, concurrency=4, use_cache=False)
+
+    assert all(result["status"] == "ok" for result in results)
+    assert (cache.created, cache.reused) == (1, 3)
+    assert len(cache_creates(fake_server)) == 1
+    cache.close()
+
+def test_short_prefix_is_sent_inline(fake_server):
+    cache = GeminiContextCache()
+    cache.generate("Short rubric.", "Essay", use_cache=False)
+
+    assert cache.created == 0
+    assert cache_creates(fake_server) == []
+    assert "cachedContent" not in generate_requests(fake_server)[0]["body"]
+
+def test_local_prefix_cache_counters():
+    prompts = []
+    cache = LocalPrefixCache(generate=lambda prompt, use_cache, model, thinking_budget: prompts.append(prompt) or "ok")
+    cache.generate("rubric A\n", "essay 1")
+    cache.generate("rubric A\n", "essay 2")
+    cache.generate("rubric B\n", "essay 3")
+
+    assert (cache.created, cache.reused) == (2, 1)
+    assert prompts == ["rubric A\nessay 1", "rubric A\nessay 2", "rubric B\nessay 3"]
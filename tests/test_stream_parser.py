@@ -0,0 +1,63 @@
+import json
+import random
+
+import pytest
+
+from backend.stream_parser import StreamingJsonParser
+
+RESPONSES = [
+    {"overall_grade": "B+", "detailed_specific_feedback": "**INTRODUCTION ANALYSIS**\nClear thesis."},
+    {"overall_grade": "A", "detailed_specific_feedback": 'Quotes "like this", a \\ backslash,\ttabs and\r\nCRLF.'},
+    {"overall_grade": "4/5", "detailed_specific_feedback": "Accents é, CJK 漢字 and emoji 👍 outside the BMP."},
+    {"overall_grade": "C", "detailed_specific_feedback": ""},
+    {"score": 87, "passed": True, "notes": None, "detailed_specific_feedback": "Scalars too."},
+]
+
+def split_randomly(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 12))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+@pytest.mark.parametrize("response", RESPONSES)
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_any_chunking_yields_the_full_object(response, ensure_ascii):
+    # ensure_ascii=True escapes non-ASCII as \uXXXX (with surrogate pairs), which chunk
+    # boundaries can split
+    text = json.dumps(response, ensure_ascii=ensure_ascii, indent=1)
+    rng = random.Random(0)
+    for _ in range(50):
+        parser = StreamingJsonParser()
+        for chunk in split_randomly(text, rng):
+            parser.feed(chunk)
+        assert parser.done
+        assert parser.values == response
+        assert parser.completed == set(response)
+        assert parser.text == text
+
+def test_one_character_at_a_time():
+    response = RESPONSES[2]
+    text = json.dumps(response)
+    parser = StreamingJsonParser()
+    for ch in text:
+        parser.feed(ch)
+
+    assert parser.values == response
+
+def test_partial_string_values_are_exposed_while_streaming():
+    parser = StreamingJsonParser()
+    parser.feed('{"overall_grade": "B+", "detailed_specific_feedback": "**INTRO')
+
+    assert parser.values == {"overall_grade": "B+", "detailed_specific_feedback": "**INTRO"}
+    assert parser.completed == {"overall_grade"}
+    assert not parser.done
+
+    parser.feed('DUCTION**\\nClear')
+    assert parser.values["detailed_specific_feedback"] == "**INTRODUCTION**\nClear"
+
+def test_escape_split_across_chunks_is_not_exposed_half_decoded():
+    parser = StreamingJsonParser()
+    parser.feed('{"detailed_specific_feedback": "caf\\u00')
+    assert parser.values["detailed_specific_feedback"] == "caf"
+    parser.feed('e9"}')
+
+    assert parser.values["detailed_specific_feedback"] == "café"
+    assert parser.done